@@ -0,0 +1,83 @@
+"""Bytes saved vs CPU cost of gateway gzip, per payload size and compression level.
+
+Drives CompressionMiddleware directly with product-list payloads shaped like
+GET /products responses, streamed in 64 KiB chunks the way the proxy relays them.
+
+    python benchmarks/gateway_compression.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "api-gateway"))
+
+from compression import CompressionMiddleware, CompressionStats  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+ITERATIONS = 200
+
+
+def product_page(rows: int) -> bytes:
+    return json.dumps([
+        {
+            "id": i,
+            "name": f"Product {i}",
+            "description": f"Description for product {i}, a reasonably typical catalog entry.",
+            "price": f"{(i % 500) + 0.99:.2f}",
+            "quantity": i % 97,
+            "created_at": "2024-01-01T00:00:00+00:00",
+            "updated_at": "2024-01-01T00:00:00+00:00",
+        }
+        for i in range(rows)
+    ]).encode()
+
+
+def upstream(payload: bytes):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        for offset in range(0, len(payload), CHUNK_SIZE):
+            chunk = payload[offset:offset + CHUNK_SIZE]
+            await send({"type": "http.response.body", "body": chunk, "more_body": offset + CHUNK_SIZE < len(payload)})
+    return app
+
+
+async def run(rows: int, level: int):
+    payload = product_page(rows)
+    stats = CompressionStats()
+    middleware = CompressionMiddleware(upstream(payload), minimum_size=1024, level=level, stats=stats)
+    scope = {"type": "http", "method": "GET", "path": "/products", "headers": [(b"accept-encoding", b"gzip")]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await middleware(scope, receive, send)
+    wall = time.perf_counter() - started
+
+    route = stats.snapshot()["/products"]
+    per_response_us = route["cpu_ms"] * 1000 / ITERATIONS
+    print(
+        f"{rows:>6} rows  level {level}  {len(payload):>9} B -> {route['bytes_out'] // ITERATIONS:>8} B"
+        f"  ratio {route['ratio']:.3f}  {per_response_us:>9.1f} us/response"
+        f"  {route['us_per_kb_saved']:>6.2f} us/KiB saved  wall {wall * 1e6 / ITERATIONS:>9.1f} us"
+    )
+
+
+async def main():
+    for rows in (10, 100, 1000, 10000):
+        for level in (1, 6, 9):
+            await run(rows, level)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
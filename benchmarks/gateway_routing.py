@@ -0,0 +1,104 @@
+"""Per-request routing overhead: FastAPI handler per service vs the route table.
+
+Builds the old gateway layout (an api_route handler per service prefix, each
+with a Request dependency and a path parameter) and the table-driven layout
+(one catch-all Starlette route resolving through Registry.match), with the
+upstream call stubbed out, and drives both straight through ASGI.
+
+    python benchmarks/gateway_routing.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "api-gateway"))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, Response  # noqa: E402
+from pools import PoolSettings  # noqa: E402
+from registry import Registry, Route, ServiceConfig  # noqa: E402
+
+ITERATIONS = 20000
+SERVICES = ("users", "products", "orders")
+PATHS = ("/users/42", "/products", "/products/7/reviews", "/orders/1001", "/nope")
+
+
+def per_route_app() -> FastAPI:
+    app = FastAPI()
+
+    def register(prefix: str):
+        async def proxy(request: Request, path: str):
+            return Response(prefix)
+
+        async def root_proxy(request: Request):
+            return Response(prefix)
+
+        app.add_api_route(f"/{prefix}/{{path:path}}", proxy, methods=["GET", "POST", "PUT", "DELETE"])
+        app.add_api_route(f"/{prefix}", root_proxy, methods=["GET", "POST", "PUT", "DELETE"])
+
+    for prefix in SERVICES:
+        register(prefix)
+    return app
+
+
+def table_app(registry: Registry) -> FastAPI:
+    app = FastAPI()
+
+    async def dispatch(request: Request):
+        route = registry.match(request.url.path)
+        if route is None:
+            return JSONResponse({"detail": "Not Found"}, status_code=404)
+        return Response(route.service)
+
+    app.add_route("/{path:path}", dispatch, methods=["GET", "POST", "PUT", "DELETE"], include_in_schema=False)
+    return app
+
+
+def build_registry() -> Registry:
+    services = {
+        prefix: ServiceConfig(prefix, [f"http://{prefix}:8000"], PoolSettings())
+        for prefix in SERVICES
+    }
+    return Registry(services, [Route(f"/{prefix}", prefix) for prefix in SERVICES])
+
+
+async def drive(app: FastAPI) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scopes = [
+        {
+            "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+            "scheme": "http", "query_string": b"", "headers": [], "server": ("gateway", 8000),
+            "http_version": "1.1", "app": app,
+        }
+        for path in PATHS
+    ]
+    for scope in scopes:
+        await app(dict(scope), receive, send)
+
+    started = time.perf_counter()
+    for i in range(ITERATIONS):
+        await app(dict(scopes[i % len(scopes)]), receive, send)
+    return (time.perf_counter() - started) * 1e6 / ITERATIONS
+
+
+async def main():
+    registry = build_registry()
+
+    started = time.perf_counter()
+    for i in range(ITERATIONS):
+        registry.match(PATHS[i % len(PATHS)])
+    match_us = (time.perf_counter() - started) * 1e6 / ITERATIONS
+
+    print(f"Registry.match          {match_us:>8.2f} us/lookup")
+    print(f"api_route per service   {await drive(per_route_app()):>8.2f} us/request")
+    print(f"route table dispatcher  {await drive(table_app(registry)):>8.2f} us/request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Logins/sec and event-loop stalls: bcrypt on the event loop vs the worker pool.
+
+Verifies a burst of passwords the way login_user does, once inline (the old
+behaviour) and once through auth.check_password, while a ticker measures how
+long the event loop goes without running anything else. Logins beyond
+PASSWORD_HASH_MAX_PENDING are rejected by the pool and reported separately.
+
+    BCRYPT_ROUNDS=12 PASSWORD_HASH_WORKERS=4 python benchmarks/user_password_hashing.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "user-service"))
+
+from fastapi import HTTPException  # noqa: E402
+from app import auth  # noqa: E402
+
+LOGINS = int(os.getenv("BENCH_LOGINS", "32"))
+TICK = 0.001
+
+
+async def ticker(stop: asyncio.Event) -> float:
+    """Longest gap between ticks, i.e. the worst stall any other request would see"""
+    worst = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(TICK)
+        now = time.perf_counter()
+        worst = max(worst, now - last - TICK)
+        last = now
+    return worst
+
+
+async def measure(name: str, login):
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(ticker(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(LOGINS)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst = await lag
+    rejected = sum(isinstance(result, HTTPException) for result in results)
+    served = LOGINS - rejected
+    print(
+        f"{name:<8} {served / elapsed:>8.1f} logins/s ({served / elapsed / os.cpu_count():.1f}/core)"
+        f"   max loop stall {worst * 1000:>8.1f} ms   rejected {rejected}"
+    )
+
+
+async def main():
+    stored = auth.pwd_context.hash("correct horse battery staple")
+    print(f"bcrypt rounds {auth.BCRYPT_ROUNDS}, {auth.HASH_WORKERS} workers, {os.cpu_count()} cores")
+
+    async def inline():
+        assert auth.verify_password("correct horse battery staple", stored)
+
+    async def pooled():
+        verified, _ = await auth.check_password("correct horse battery staple", stored)
+        assert verified
+
+    await measure("inline", inline)
+    await measure("pool", pooled)
+    auth.password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
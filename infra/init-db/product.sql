@@ -5,9 +5,48 @@ CREATE TABLE IF NOT EXISTS products (
     description TEXT,
     price DECIMAL(10, 2) NOT NULL,
     quantity INTEGER NOT NULL DEFAULT 0,
+    stock_shards INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Hot products can keep their stock in several counter rows so reservations do not
+-- all queue on one row lock; products.quantity is then 0 and the shards hold the stock
+CREATE TABLE IF NOT EXISTS product_stock_shards (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    shard INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, shard)
+);
+
 CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
 CREATE INDEX IF NOT EXISTS idx_products_price ON products(price);
+
+-- Keyset pagination: ORDER BY (price, id) and name prefix (LIKE 'abc%') range scans
+CREATE INDEX IF NOT EXISTS idx_products_price_id ON products(price, id);
+CREATE INDEX IF NOT EXISTS idx_products_name_pattern ON products(name text_pattern_ops, id);
+
+-- Full-text search: PostgreSQL keeps the generated vector current on every write
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_products_search ON products USING GIN (search_vector);
+
+-- Inventory holds: stock taken per order, returned unless confirmed before expires_at
+CREATE TABLE IF NOT EXISTS inventory_holds (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'held',
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_inventory_holds_order_id ON inventory_holds(order_id);
+CREATE INDEX IF NOT EXISTS idx_inventory_holds_expiry ON inventory_holds(expires_at) WHERE status = 'held';
+
+-- Incremental catalog exports: GET /products/export?updated_since=...
+CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products(updated_at);
@@ -1,11 +1,33 @@
 
 import os
+import json
+import time
+import asyncio
 import httpx
 import logging
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Dict, Any
+from fastapi.responses import Response, JSONResponse
+from typing import Any, List, Optional, Tuple, Union, AsyncIterator
+from urllib.parse import urlsplit
+from pools import UpstreamPools
+from balancer import ServiceBalancer, Instance
+from registry import Registry, RegistryError, Route
+from coalesce import SingleFlight
+from limiter import AdaptiveLimiter, CircuitBreaker
+from hedging import HedgePolicy
+from proxy import (
+    filter_request_headers,
+    filter_response_headers,
+    stream_response,
+    buffered_response,
+    cache_entry_response
+)
+from cache import ResponseCache, CacheEntry, make_etag, etag_matches
+from auth import identity_headers, token_cache
+from compression import CompressionMiddleware, CompressionStats, route_template
+from metrics import GatewayMetrics, MetricsMiddleware
+from schemas import BatchItem, BatchRequest, BatchItemResult, BatchResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,180 +46,666 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset paging cursor for GET /products/
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Service URLs
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:8031")
-PRODUCT_SERVICE_URL = os.getenv("PRODUCT_SERVICE_URL", "http://product-service:8032")
-ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://order-service:8033")
+# Negotiated gzip for large responses
+compression_stats = CompressionStats()
+if os.getenv("GATEWAY_GZIP_ENABLED", "true").lower() == "true":
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("GATEWAY_GZIP_MIN_SIZE", "1024")),
+        level=int(os.getenv("GATEWAY_GZIP_LEVEL", "1")),
+        stats=compression_stats,
+    )
 
-# Simple round-robin load balancer state
-service_instances = {
-    "user": [USER_SERVICE_URL],
-    "product": [PRODUCT_SERVICE_URL],
-    "order": [ORDER_SERVICE_URL]
-}
 
-current_index = {"user": 0, "product": 0, "order": 0}
+def metrics_labels(path: str) -> Optional[Tuple[str, str]]:
+    """Service and route template for a proxied path; None for gateway endpoints"""
+    if path == "/metrics" or path.startswith("/gateway/"):
+        return None
+    route = registry.match(path)
+    if route is None:
+        return None
+    return route.service, route_template(path)
 
 
-def get_next_service(service_type: str) -> str:
-    
-    instances = service_instances[service_type]
-    index = current_index[service_type]
-    current_index[service_type] = (index + 1) % len(instances)
-    return instances[index]
+# Latency histograms, byte and status counters per service and route, served at /metrics
+gateway_metrics = GatewayMetrics(int(os.getenv("GATEWAY_METRICS_MAX_ROUTES", "256")))
+if os.getenv("GATEWAY_METRICS_ENABLED", "true").lower() == "true":
+    # Added last so it is outermost and counts the bytes actually sent
+    app.add_middleware(MetricsMiddleware, metrics=gateway_metrics, resolve=metrics_labels)
 
+# Service registry and prefix route table, hot-reloadable from GATEWAY_ROUTES_FILE
+ROUTES_FILE = os.getenv("GATEWAY_ROUTES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "routes.json"))
+ROUTES_POLL_INTERVAL = float(os.getenv("GATEWAY_ROUTES_POLL_INTERVAL", "5"))
+RELOAD_GRACE_PERIOD = float(os.getenv("GATEWAY_RELOAD_GRACE_PERIOD", "60"))
+registry = Registry.from_file(ROUTES_FILE)
 
-async def forward_request(
+# Per-service runtime state: latency-aware balancers, adaptive limits and circuit breakers
+service_instances = {name: ServiceBalancer.from_env(service.urls) for name, service in registry.services.items()}
+service_limiters = {name: AdaptiveLimiter.from_env(name, service.pool) for name, service in registry.services.items()}
+service_breakers = {name: CircuitBreaker.from_env(name) for name in registry.services}
+
+# Hedge delay and budget per service, for routes with hedge enabled
+service_hedgers = {name: HedgePolicy.from_env() for name in registry.services}
+
+# Batch endpoint limits
+BATCH_MAX_ITEMS = int(os.getenv("GATEWAY_BATCH_MAX_ITEMS", "20"))
+BATCH_CONCURRENCY = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "8"))
+BATCH_DEADLINE_MS = int(os.getenv("GATEWAY_BATCH_DEADLINE_MS", "5000"))
+BATCH_INHERITED_HEADERS = {"authorization", "accept", "accept-language"}
+BATCH_RESULT_HEADERS = {"content-type", "etag", "x-cache", "retry-after"}
+
+# Verify Bearer tokens locally and pass the caller's identity upstream as headers
+JWT_VERIFY_ENABLED = os.getenv("GATEWAY_JWT_VERIFY", "true").lower() == "true"
+
+# Only these methods are retried on connection errors (route "retries")
+RETRYABLE_METHODS = {"GET", "HEAD"}
+
+# Relay request and response bodies chunk by chunk instead of buffering them
+STREAMING_ENABLED = os.getenv("GATEWAY_STREAMING", "true").lower() == "true"
+
+# GET response cache; routes opt in with cache_ttl
+response_cache = ResponseCache.from_env()
+
+# Identical concurrent GETs on routes with coalesce enabled share one upstream call
+singleflight = SingleFlight()
+
+# Long-lived pooled HTTP clients, one per upstream service
+upstream_pools = UpstreamPools()
+
+
+@app.on_event("startup")
+async def open_upstream_pools():
+    """Create pooled upstream clients on startup"""
+    for name, service in registry.services.items():
+        upstream_pools.open(name, service.pool)
+    if ROUTES_POLL_INTERVAL > 0:
+        asyncio.create_task(watch_routes_file(routes_file_signature()))
+
+
+@app.on_event("shutdown")
+async def close_upstream_pools():
+    """Close pooled upstream clients on shutdown"""
+    await upstream_pools.close()
+
+
+async def close_later(client: httpx.AsyncClient):
+    """Close a replaced client once requests already using it have had time to finish"""
+    await asyncio.sleep(RELOAD_GRACE_PERIOD)
+    await client.aclose()
+
+
+def apply_registry(new_registry: Registry):
+    """Bring per-service runtime state in line with a new registry, then swap it in"""
+    global registry
+    for name, service in new_registry.services.items():
+        if name in service_instances:
+            service_instances[name].update_urls(service.urls)
+        else:
+            service_instances[name] = ServiceBalancer.from_env(service.urls)
+            service_limiters[name] = AdaptiveLimiter.from_env(name, service.pool)
+            service_breakers[name] = CircuitBreaker.from_env(name)
+            service_hedgers[name] = HedgePolicy.from_env()
+        if upstream_pools.settings(name) != service.pool:
+            previous = upstream_pools.open(name, service.pool)
+            if previous is not None:
+                asyncio.create_task(close_later(previous))
+
+    registry = new_registry
+
+    for name in list(service_instances):
+        if name not in new_registry.services:
+            del service_instances[name], service_limiters[name], service_breakers[name], service_hedgers[name]
+            client = upstream_pools.detach(name)
+            if client is not None:
+                asyncio.create_task(close_later(client))
+    logger.info(f"Loaded route table from {new_registry.source}: {len(new_registry.routes)} routes")
+
+
+def routes_file_signature() -> Tuple[int, int, int]:
+    # Size and inode catch edits that land within the filesystem's mtime granularity
+    stat = os.stat(ROUTES_FILE)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+async def watch_routes_file(last_signature: Tuple[int, int, int]):
+    """Reload the route table when its file changes"""
+    while True:
+        await asyncio.sleep(ROUTES_POLL_INTERVAL)
+        try:
+            signature = routes_file_signature()
+            if signature == last_signature:
+                continue
+            last_signature = signature
+            apply_registry(Registry.from_file(ROUTES_FILE))
+        except (OSError, RegistryError) as e:
+            logger.error(f"Keeping current route table, reload failed: {e}")
+
+
+async def send_to_instance(
     service_type: str,
     path: str,
     method: str,
-    headers: Dict[str, str],
-    body: bytes = None,
-    params: Dict[str, Any] = None
-) -> JSONResponse:
+    headers: List[Tuple[str, str]],
+    body: Union[bytes, AsyncIterator[bytes], None],
+    params: List[Tuple[str, str]],
+    stream: bool,
+    timeout: Optional[float],
+    tried: Optional[List[Instance]] = None
+) -> httpx.Response:
+    """One attempt against the best instance of a service, with limiter, breaker and balancer bookkeeping.
+
+    Instances in tried are skipped and the chosen one is appended, so a
+    hedged attempt lands on a different replica than the original.
+    """
+    balancer = service_instances.get(service_type)
+    if balancer is None:
+        raise HTTPException(status_code=503, detail="Service unavailable")
+    limiter = service_limiters[service_type]
+    breaker = service_breakers[service_type]
+    if not limiter.try_acquire():
+        raise HTTPException(status_code=503, detail="Service overloaded", headers={"Retry-After": "1"})
+    if not breaker.allow():
+        limiter.release_unused()
+        raise HTTPException(
+            status_code=503,
+            detail="Service unavailable",
+            headers={"Retry-After": str(breaker.retry_after())}
+        )
     
-    service_url = get_next_service(service_type)
+    instance = balancer.pick(tried or ())
+    if instance is None:
+        limiter.release_unused()
+        breaker.abandon()
+        raise HTTPException(status_code=503, detail="No other instance available")
+    if tried is not None:
+        tried.append(instance)
+    service_url = instance.url
     url = f"{service_url}{path}"
     
+    client = upstream_pools.client(service_type)
+    upstream_metrics = gateway_metrics.upstream(service_type)
+    upstream_metrics.in_flight += 1
+    started = time.monotonic()
+    ok = False
+    shed = False
+    cancelled = False
+    
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Remove host header to avoid conflicts
-            forward_headers = {k: v for k, v in headers.items() if k.lower() != "host"}
-            
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=forward_headers,
-                content=body,
-                params=params
-            )
-            
-            return JSONResponse(
-                content=response.json() if response.headers.get("content-type", "").startswith("application/json") else response.text,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
+        upstream_request = client.build_request(
+            method=method,
+            url=url,
+            headers=filter_request_headers(headers),
+            content=body,
+            params=params,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        )
+        response = await client.send(upstream_request, stream=stream)
+        ok = response.status_code < 500
+        # A 503 with Retry-After is the instance shedding load (e.g. a login burst), not failing
+        shed = response.status_code == 503 and "retry-after" in response.headers
+        return response
     
+    except asyncio.CancelledError:
+        # Lost a hedge race or the client went away: not the instance's fault
+        cancelled = True
+        raise
     except httpx.TimeoutException:
         logger.error(f"Timeout forwarding request to {service_url}")
-        raise HTTPException(status_code=504, detail="Service timeout")
+        raise
     except httpx.ConnectError:
         logger.error(f"Connection error forwarding request to {service_url}")
-        raise HTTPException(status_code=503, detail="Service unavailable")
+        raise
     except Exception as e:
         logger.error(f"Error forwarding request to {service_url}: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+        raise
+    finally:
+        latency = time.monotonic() - started
+        upstream_metrics.in_flight -= 1
+        if cancelled:
+            balancer.abandon(instance, latency)
+            limiter.release_unused()
+            breaker.abandon()
+        elif shed:
+            # Backs off the concurrency limit, but neither ejects the instance nor trips the breaker
+            upstream_metrics.errors += 1
+            balancer.abandon(instance, latency)
+            limiter.release(latency, False)
+            breaker.abandon()
+        else:
+            upstream_metrics.latency.observe(latency)
+            if not ok:
+                upstream_metrics.errors += 1
+            elif method == "GET" and service_type in service_hedgers:
+                service_hedgers[service_type].observe(latency)
+            balancer.release(instance, latency, ok)
+            limiter.release(latency, ok)
+            breaker.record(ok)
 
 
-@app.get("/")
-async def root():
-    """Root endpoint"""
-    return {"message": "API Gateway is running", "services": list(service_instances.keys())}
+async def send_upstream(
+    service_type: str,
+    path: str,
+    method: str,
+    headers: List[Tuple[str, str]],
+    body: Union[bytes, AsyncIterator[bytes], None] = None,
+    params: List[Tuple[str, str]] = None,
+    stream: bool = False,
+    timeout: Optional[float] = None,
+    retries: int = 0,
+    tried: Optional[List[Instance]] = None
+) -> httpx.Response:
+    """Send a request upstream and return the raw response, retrying idempotent reads on connect errors"""
+    attempts = retries + 1 if method in RETRYABLE_METHODS else 1
+    for attempt in range(attempts):
+        try:
+            return await send_to_instance(service_type, path, method, headers, body, params, stream, timeout, tried)
+        except HTTPException:
+            raise
+        except httpx.ConnectError:
+            if attempt + 1 < attempts:
+                continue
+            raise HTTPException(status_code=503, detail="Service unavailable")
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="Service timeout")
+        except Exception:
+            raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "ok", "service": "api-gateway"}
+async def forward_request(
+    route: Route,
+    path: str,
+    method: str,
+    headers: List[Tuple[str, str]],
+    body: Union[bytes, AsyncIterator[bytes], None] = None,
+    params: List[Tuple[str, str]] = None,
+    stream: bool = STREAMING_ENABLED
+) -> Response:
+    
+    if method == "GET" and route.hedge:
+        response = await send_hedged(route, path, headers, params, stream)
+    else:
+        response = await send_upstream(
+            route.service, path, method, headers, body, params, stream, route.timeout, route.retries
+        )
+    if stream:
+        return stream_response(response)
+    return buffered_response(response)
 
 
+async def send_hedged(
+    route: Route,
+    path: str,
+    headers: List[Tuple[str, str]],
+    params: List[Tuple[str, str]],
+    stream: bool
+) -> httpx.Response:
+    """GET that sends a second attempt to another instance once the first outlasts the hedge delay.
 
-@app.api_route("/users/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
-async def user_service_proxy(request: Request, path: str):
+    The first response wins and the other attempt is cancelled. Hedges stay
+    within the service's hedge budget.
+    """
+    policy = service_hedgers.get(route.service)
+    balancer = service_instances.get(route.service)
+    delay = policy.delay() if policy is not None else None
+    if delay is None or balancer is None or len(balancer.instances) < 2:
+        return await send_upstream(route.service, path, "GET", headers, None, params, stream, route.timeout, route.retries)
     
-    body = await request.body() if request.method in ["POST", "PUT"] else None
-    params = dict(request.query_params)
+    policy.start()
+    tried: List[Instance] = []
     
-    return await forward_request(
-        "user",
-        f"/users/{path}",
-        request.method,
-        dict(request.headers),
-        body,
-        params
-    )
+    def attempt() -> asyncio.Task:
+        return asyncio.ensure_future(send_upstream(
+            route.service, path, "GET", headers, None, params, stream, route.timeout, route.retries, tried
+        ))
+    
+    tasks = [attempt()]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not policy.try_hedge():
+            return await tasks[0]
+        upstream_metrics = gateway_metrics.upstream(route.service)
+        upstream_metrics.hedges += 1
+        tasks.append(attempt())
+        
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            finished = [task for task in tasks if task in done]
+            for task in finished:
+                if task.exception() is not None and error is None:
+                    error = task.exception()
+            winners = [task for task in finished if task.exception() is None]
+            if winners:
+                # Both answered in the same tick: keep the first, release the other's connection
+                for task in winners[1:]:
+                    await task.result().aclose()
+                if winners[0] is tasks[1]:
+                    upstream_metrics.hedges_won += 1
+                return winners[0].result()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
 
 
-# Product Service Routes
-@app.api_route("/products/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
-async def product_service_proxy(request: Request, path: str):
+async def cached_get(
+    request: Request,
+    route: Route,
+    path: str,
+    forward_headers: List[Tuple[str, str]]
+) -> Response:
+    """Serve a GET from the response cache, filling it from upstream on a miss"""
+    params = request.query_params.multi_items()
+    key = response_cache.make_key(path, params, request.headers)
+    bypass = "no-cache" in request.headers.get("cache-control", "").lower()
     
-    body = await request.body() if request.method in ["POST", "PUT"] else None
-    params = dict(request.query_params)
+    entry = None if bypass else response_cache.get(key)
+    cache_status = "HIT"
+    if entry is None:
+        cache_status = "MISS"
+        generation = response_cache.generation(path)
+        # Conditional headers are answered here, not upstream
+        upstream = await fetch_get(route, path, unconditional(forward_headers), params, key)
+        if not is_cacheable(upstream):
+            return buffered_response(upstream)
+        entry = CacheEntry(
+            path,
+            upstream.status_code,
+            filter_response_headers(upstream.headers.multi_items(), decoded=True, exclude={"etag", "date"}),
+            upstream.content,
+            upstream.headers.get("etag") or make_etag(upstream.content),
+            route.cache_ttl
+        )
+        # Not stored if a write to the collection landed while this was in flight
+        response_cache.put(key, entry, generation)
     
-    return await forward_request(
-        "product",
-        f"/products/{path}",
-        request.method,
-        dict(request.headers),
-        body,
-        params
-    )
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        response_cache.not_modified += 1
+        return cache_entry_response(entry, cache_status, route.cache_ttl, not_modified=True)
+    return cache_entry_response(entry, cache_status, route.cache_ttl)
+
+
+def unconditional(headers: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Headers without If-None-Match/If-Modified-Since, for upstream responses shared between callers"""
+    return [(k, v) for k, v in headers if k.lower() not in ("if-none-match", "if-modified-since")]
 
 
-# Order Service Routes
-@app.api_route("/orders/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
-async def order_service_proxy(request: Request, path: str):
+async def fetch_get(
+    route: Route,
+    path: str,
+    headers: List[Tuple[str, str]],
+    params: List[Tuple[str, str]],
+    key: str
+) -> httpx.Response:
+    """Buffered upstream GET, coalesced with identical in-flight GETs where enabled"""
+    def send():
+        if route.hedge:
+            return send_hedged(route, path, headers, params, False)
+        return send_upstream(route.service, path, "GET", headers, None, params, False, route.timeout, route.retries)
     
-    body = await request.body() if request.method in ["POST", "PUT"] else None
-    params = dict(request.query_params)
+    if not route.coalesce:
+        return await send()
+    # Calls started after a write do not join a fetch that may have read the old data
+    return await singleflight.do(f"{route.service}|{response_cache.generation(path)}|{key}", send)
+
+
+def is_cacheable(upstream: httpx.Response) -> bool:
+    if upstream.status_code != 200 or "set-cookie" in upstream.headers:
+        return False
+    cache_control = upstream.headers.get("cache-control", "").lower()
+    return "no-store" not in cache_control and "private" not in cache_control
+
+
+async def proxy_request(
+    request: Request,
+    route: Route,
+    path: str,
+    stream: bool = STREAMING_ENABLED
+) -> Response:
+    """Forward a client request, streaming the body through unless streaming is disabled"""
+    headers = identity_headers(request.headers.items(), verify=JWT_VERIFY_ENABLED)
     
-    return await forward_request(
-        "order",
-        f"/orders/{path}",
-        request.method,
-        dict(request.headers),
-        body,
-        params
-    )
+    if request.method == "GET" and route.cache_ttl is not None:
+        return await cached_get(request, route, path, headers)
+    if request.method == "GET" and route.coalesce:
+        params = request.query_params.multi_items()
+        key = response_cache.make_key(path, params, request.headers)
+        # Callers sharing this fetch may send different validators, so none get a 304 meant for another
+        upstream = await fetch_get(route, path, unconditional(headers), params, key)
+        return buffered_response(upstream)
+    
+    if request.method in ["POST", "PUT", "PATCH"]:
+        body = request.stream() if stream else await request.body()
+    else:
+        body = None
+    
+    try:
+        return await forward_request(
+            route,
+            path,
+            request.method,
+            headers,
+            body,
+            request.query_params.multi_items(),
+            stream
+        )
+    finally:
+        # Also for uncached routes that write to a cached collection, e.g. POST /products/bulk
+        if request.method != "GET":
+            response_cache.invalidate_for_write(path)
+
 
+async def dispatch(request: Request) -> Response:
+    """Route any request through the prefix table to its upstream service"""
+    path = request.url.path
+    route = registry.match(path)
+    if route is None:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    if request.method not in route.methods:
+        return JSONResponse({"detail": "Method Not Allowed"}, status_code=405)
+    return await proxy_request(request, route, route.upstream_path(path))
 
-# Handle root level routes for each service
-@app.api_route("/users", methods=["GET", "POST", "PUT", "DELETE"])
-async def user_service_root_proxy(request: Request):
+
+def build_sub_request(parent: Request, item: BatchItem) -> Request:
+    """Synthesize a client request for one batch item, inheriting the caller's credentials"""
+    parts = urlsplit(item.path)
+    headers = {k.lower(): v for k, v in parent.headers.items() if k.lower() in BATCH_INHERITED_HEADERS}
+    headers.update({k.lower(): v for k, v in item.headers.items()})
+    headers.pop("content-length", None)
     
-    body = await request.body() if request.method in ["POST", "PUT"] else None
-    params = dict(request.query_params)
+    body = b""
+    if item.body is not None:
+        body = json.dumps(item.body).encode()
+        headers.setdefault("content-type", "application/json")
+        headers["content-length"] = str(len(body))
     
-    return await forward_request(
-        "user",
-        "/users",
-        request.method,
-        dict(request.headers),
-        body,
-        params
-    )
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": item.method.upper(),
+        "scheme": parent.url.scheme,
+        "root_path": "",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        "client": parent.scope.get("client"),
+        "server": parent.scope.get("server"),
+    }
+    
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    
+    return Request(scope, receive)
+
 
+def decode_body(response: Response) -> Any:
+    if not response.body:
+        return None
+    if response.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(response.body)
+    return response.body.decode("utf-8", errors="replace")
 
-@app.api_route("/products", methods=["GET", "POST", "PUT", "DELETE"])
-async def product_service_root_proxy(request: Request):
+
+async def run_batch_item(parent: Request, item: BatchItem, semaphore: asyncio.Semaphore) -> BatchItemResult:
+    """Run one batch item through the regular proxy path"""
+    path = urlsplit(item.path).path
+    route = registry.match(path)
+    if route is None:
+        return BatchItemResult(id=item.id, status=404, body={"detail": "Not Found"})
+    if item.method.upper() not in route.methods:
+        return BatchItemResult(id=item.id, status=405, body={"detail": "Method Not Allowed"})
     
-    body = await request.body() if request.method in ["POST", "PUT"] else None
-    params = dict(request.query_params)
+    async with semaphore:
+        try:
+            response = await proxy_request(
+                build_sub_request(parent, item), route, route.upstream_path(path), stream=False
+            )
+        except HTTPException as e:
+            return BatchItemResult(id=item.id, status=e.status_code, headers=e.headers or {}, body={"detail": e.detail})
     
-    return await forward_request(
-        "product",
-        "/products",
-        request.method,
-        dict(request.headers),
-        body,
-        params
+    return BatchItemResult(
+        id=item.id,
+        status=response.status_code,
+        headers={k: v for k, v in response.headers.items() if k in BATCH_RESULT_HEADERS},
+        body=decode_body(response)
     )
 
 
-@app.api_route("/orders", methods=["GET", "POST", "PUT", "DELETE"])
-async def order_service_root_proxy(request: Request):
+@app.get("/")
+async def root():
+    """Root endpoint"""
+    return {"message": "API Gateway is running", "services": list(registry.services.keys())}
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {"status": "ok", "service": "api-gateway"}
+
+
+@app.post("/batch", response_model=BatchResponse)
+async def batch(request: Request, batch_request: BatchRequest):
+    """Run several sub-requests concurrently and return all results in one response"""
+    items = batch_request.requests
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_ITEMS} requests")
     
-    body = await request.body() if request.method in ["POST", "PUT"] else None
-    params = dict(request.query_params)
+    deadline_ms = min(batch_request.deadline_ms or BATCH_DEADLINE_MS, BATCH_DEADLINE_MS)
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = [asyncio.ensure_future(run_batch_item(request, item, semaphore)) for item in items]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=deadline_ms / 1000)
+        for task in pending:
+            task.cancel()
     
-    return await forward_request(
-        "order",
-        "/orders",
-        request.method,
-        dict(request.headers),
-        body,
-        params
-    )
+    results = []
+    for item, task in zip(items, tasks):
+        if task.cancelled() or not task.done():
+            results.append(BatchItemResult(id=item.id, status=504, body={"detail": "Batch deadline exceeded"}))
+        elif task.exception() is not None:
+            logger.error(f"Error running batch item {item.method} {item.path}: {task.exception()}")
+            results.append(BatchItemResult(id=item.id, status=500, body={"detail": "Internal server error"}))
+        else:
+            results.append(task.result())
+    return BatchResponse(responses=results)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Request metrics in Prometheus text format"""
+    return Response(gateway_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/gateway/pools")
+async def pool_stats():
+    """Upstream connection pool stats"""
+    return upstream_pools.stats()
+
+
+@app.get("/gateway/cache")
+async def cache_stats():
+    """Response cache hit/miss/eviction counters"""
+    return response_cache.stats()
+
+
+@app.get("/gateway/coalescing")
+async def coalescing_stats():
+    """Counts of upstream GETs issued and requests collapsed onto them"""
+    return singleflight.stats()
+
+
+@app.get("/gateway/limits")
+async def limit_stats():
+    """Concurrency limiter and circuit breaker state per upstream"""
+    return {
+        service_type: {
+            "limiter": service_limiters[service_type].stats(),
+            "breaker": service_breakers[service_type].stats()
+        }
+        for service_type in registry.services
+    }
+
+
+@app.get("/gateway/hedging")
+async def hedging_stats():
+    """Hedge delay, budget and outcomes per upstream"""
+    result = {}
+    for service_type in registry.services:
+        upstream_metrics = gateway_metrics.upstream(service_type)
+        result[service_type] = {
+            **service_hedgers[service_type].stats(),
+            "hedges": upstream_metrics.hedges,
+            "hedges_won": upstream_metrics.hedges_won,
+        }
+    return result
+
+
+@app.get("/gateway/compression")
+async def compression_route_stats():
+    """Bytes saved and compression CPU time per route"""
+    return compression_stats.snapshot()
+
+
+@app.get("/gateway/tokens")
+async def token_cache_stats():
+    """Verified-token cache stats"""
+    return token_cache.stats()
+
+
+@app.get("/gateway/routes")
+async def route_table():
+    """Current service registry and route table"""
+    return registry.as_dict()
+
+
+@app.post("/gateway/reload")
+async def reload_routes():
+    """Reload the route table from GATEWAY_ROUTES_FILE"""
+    try:
+        apply_registry(Registry.from_file(ROUTES_FILE))
+    except RegistryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return registry.as_dict()
+
+
+@app.get("/gateway/instances")
+async def instance_stats():
+    """Per-instance in-flight, latency and ejection state"""
+    return {service_type: balancer.stats() for service_type, balancer in service_instances.items()}
+
+
+# Everything not handled above goes through the route table. A plain Starlette
+# route skips FastAPI's per-request dependency resolution.
+app.add_route(
+    "/{path:path}",
+    dispatch,
+    methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    include_in_schema=False
+)
@@ -0,0 +1,115 @@
+
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple, Iterable, Optional
+from jose import JWTError, jwt
+from fastapi import HTTPException, status
+
+# Must match the user-service signing configuration
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+
+# Headers the gateway sets for upstreams; never accepted from clients
+IDENTITY_HEADERS = ("x-user-id", "x-user-email", "x-gateway-token")
+
+# Shared with upstreams so they only trust identity headers the gateway set
+GATEWAY_IDENTITY_TOKEN = os.getenv("GATEWAY_IDENTITY_TOKEN", "")
+
+
+class TokenCache:
+    """Bounded LRU of verified token claims, keyed by token digest and kept until exp"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes) -> Optional[Dict[str, Any]]:
+        claims = self._entries.get(digest)
+        if claims is None:
+            self.misses += 1
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return claims
+
+    def put(self, digest: bytes, claims: Dict[str, Any]):
+        self._entries[digest] = claims
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(int(os.getenv("GATEWAY_TOKEN_CACHE_SIZE", "10000")))
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    """Verify a JWT locally, using the cache for tokens seen before"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(digest)
+    if claims is not None:
+        return claims
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("sub") is None or payload.get("exp") is None:
+        raise credentials_exception
+
+    claims = {"sub": payload["sub"], "uid": payload.get("uid"), "exp": payload["exp"]}
+    token_cache.put(digest, claims)
+    return claims
+
+
+def identity_headers(headers: Iterable[Tuple[str, str]], verify: bool = True) -> List[Tuple[str, str]]:
+    """Strip client-supplied identity headers and, if verify, add verified ones for a Bearer token.
+
+    An invalid or expired token is dropped rather than rejected, so public
+    routes keep working and protected ones get the upstream's own 401.
+    """
+    forwarded = []
+    authorization = None
+    for key, value in headers:
+        name = key.lower()
+        if name in IDENTITY_HEADERS:
+            continue
+        if name == "authorization":
+            authorization = (key, value)
+            continue
+        forwarded.append((key, value))
+
+    if authorization is None:
+        return forwarded
+    scheme, _, token = authorization[1].partition(" ")
+    if not verify or scheme.lower() != "bearer" or not token:
+        forwarded.append(authorization)
+        return forwarded
+
+    try:
+        claims = verify_token(token.strip())
+    except HTTPException:
+        return forwarded
+    forwarded.append(authorization)
+    if GATEWAY_IDENTITY_TOKEN:
+        forwarded.append(("x-gateway-token", GATEWAY_IDENTITY_TOKEN))
+    forwarded.append(("x-user-email", claims["sub"]))
+    if claims["uid"] is not None:
+        forwarded.append(("x-user-id", str(claims["uid"])))
+    return forwarded
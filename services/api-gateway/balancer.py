@@ -0,0 +1,176 @@
+
+import os
+import math
+import time
+import random
+import logging
+from typing import Dict, List, Any, Optional, Collection
+
+logger = logging.getLogger(__name__)
+
+
+class Instance:
+    """One upstream replica and its passive health / latency state"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.ewma_latency = 0.0
+        self.last_sample = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until: Optional[float] = None
+        self.backoff = 0.0
+        self.probing = False
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until is not None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.ejected,
+            "readmit_in": round(max(0.0, self.ejected_until - now), 3) if self.ejected else None,
+        }
+
+
+class ServiceBalancer:
+    """Power-of-two-choices balancer with passive ejection of failing instances"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        strategy: str = "ewma",
+        failure_threshold: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        ewma_decay: float = 0.3,
+        decay_window: float = 10.0
+    ):
+        if not urls:
+            raise ValueError("A service needs at least one instance")
+        if strategy not in ("ewma", "least-outstanding"):
+            raise ValueError(f"Unknown load balancing strategy '{strategy}'")
+        self.instances = [Instance(url) for url in urls]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.ewma_decay = ewma_decay
+        self.decay_window = decay_window
+
+    @classmethod
+    def from_env(cls, urls: List[str]) -> "ServiceBalancer":
+        """Balancer over urls with GATEWAY_LB_* settings"""
+        return cls(
+            urls,
+            strategy=os.getenv("GATEWAY_LB_STRATEGY", "ewma"),
+            failure_threshold=int(os.getenv("GATEWAY_LB_FAILURE_THRESHOLD", "5")),
+            base_backoff=float(os.getenv("GATEWAY_LB_BASE_BACKOFF", "1.0")),
+            max_backoff=float(os.getenv("GATEWAY_LB_MAX_BACKOFF", "30.0")),
+            decay_window=float(os.getenv("GATEWAY_LB_DECAY_WINDOW", "10.0")),
+        )
+
+    def update_urls(self, urls: List[str]):
+        """Swap the instance list, keeping state for instances that stay"""
+        current = {instance.url: instance for instance in self.instances}
+        self.instances = [current.get(url.rstrip("/")) or Instance(url) for url in urls]
+
+    def _score(self, instance: Instance, now: float) -> float:
+        if self.strategy == "least-outstanding":
+            return instance.in_flight
+        # Unmeasured instances score 0 so they get traffic and a latency sample;
+        # a stale sample decays so one slow request cannot starve an instance forever
+        idle = now - instance.last_sample
+        latency = instance.ewma_latency * math.exp(-idle / self.decay_window)
+        return latency * (instance.in_flight + 1)
+
+    def pick(self, exclude: Collection[Instance] = ()) -> Optional[Instance]:
+        """Choose an instance and mark a request in flight on it.
+
+        With exclude (hedged requests), only healthy instances outside it are
+        considered and None is returned when there are none.
+        """
+        now = time.monotonic()
+        if exclude:
+            healthy = [instance for instance in self.instances if not instance.ejected and instance not in exclude]
+            if not healthy:
+                return None
+        else:
+            healthy = []
+            for instance in self.instances:
+                if not instance.ejected:
+                    healthy.append(instance)
+                elif instance.ejected_until <= now and not instance.probing:
+                    # Backoff elapsed: let one real request through as a probe
+                    instance.probing = True
+                    return self._start(instance)
+
+            if not healthy:
+                # Everything is ejected: fail open on the instance due back soonest
+                return self._start(min(self.instances, key=lambda instance: instance.ejected_until))
+        if len(healthy) == 1:
+            return self._start(healthy[0])
+
+        first, second = random.sample(healthy, 2)
+        return self._start(first if self._score(first, now) <= self._score(second, now) else second)
+
+    def _start(self, instance: Instance) -> Instance:
+        instance.in_flight += 1
+        instance.requests += 1
+        return instance
+
+    def release(self, instance: Instance, latency: float, ok: bool):
+        """Record the outcome of a request started with pick()"""
+        instance.in_flight = max(0, instance.in_flight - 1)
+        instance.last_sample = time.monotonic()
+        if instance.ewma_latency == 0.0:
+            instance.ewma_latency = latency
+        else:
+            instance.ewma_latency += self.ewma_decay * (latency - instance.ewma_latency)
+
+        if ok:
+            instance.consecutive_failures = 0
+            if instance.ejected:
+                logger.info(f"Re-admitting instance {instance.url}")
+            instance.ejected_until = None
+            instance.backoff = 0.0
+            instance.probing = False
+            return
+
+        instance.failures += 1
+        instance.consecutive_failures += 1
+        if instance.probing or (not instance.ejected and instance.consecutive_failures >= self.failure_threshold):
+            self._eject(instance)
+
+    def abandon(self, instance: Instance, latency: float):
+        """Record a request cancelled mid-flight (hedge loser, client gone) without counting a failure"""
+        instance.in_flight = max(0, instance.in_flight - 1)
+        instance.probing = False
+        # The elapsed time is a lower bound on the real latency, still worth folding in
+        if latency > instance.ewma_latency:
+            instance.last_sample = time.monotonic()
+            instance.ewma_latency += self.ewma_decay * (latency - instance.ewma_latency)
+
+    def _eject(self, instance: Instance):
+        if instance.backoff:
+            instance.backoff = min(self.max_backoff, instance.backoff * 2)
+        else:
+            instance.backoff = self.base_backoff
+        instance.ejected_until = time.monotonic() + instance.backoff
+        instance.probing = False
+        logger.warning(
+            f"Ejecting instance {instance.url} for {instance.backoff:.1f}s "
+            f"after {instance.consecutive_failures} consecutive failures"
+        )
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [instance.stats() for instance in self.instances]
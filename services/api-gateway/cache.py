@@ -0,0 +1,216 @@
+
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional, Iterable, Any
+from urllib.parse import urlencode
+
+# Request headers whose value changes the upstream representation
+VARY_HEADERS = ("accept", "accept-language", "authorization")
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def collection_of(path: str) -> str:
+    """First path segment, e.g. /products for /products/42"""
+    return "/" + path.strip("/").split("/", 1)[0]
+
+
+class CacheEntry:
+    """A cached upstream GET response"""
+
+    __slots__ = ("path", "status_code", "headers", "body", "etag", "stored_at", "expires_at", "size")
+
+    def __init__(
+        self,
+        path: str,
+        status_code: int,
+        headers: List[Tuple[str, str]],
+        body: bytes,
+        etag: str,
+        ttl: float
+    ):
+        self.path = path
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+        self.size = len(body) + sum(len(key) + len(value) for key, value in headers) + len(path)
+
+    def age(self) -> int:
+        return int(time.monotonic() - self.stored_at)
+
+
+class ResponseCache:
+    """Bounded-memory LRU cache of GET responses; TTLs come from the route table"""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_bytes: int = 1024 * 1024
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._keys_by_path: Dict[str, set] = {}
+        # Bumped on every write to a collection; fills fetched before a write are dropped
+        self._generations: Dict[str, int] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.not_modified = 0
+        self.stale_fills = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            max_bytes=int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            max_entry_bytes=int(os.getenv("GATEWAY_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024))),
+        )
+
+    def make_key(
+        self,
+        path: str,
+        query_items: Iterable[Tuple[str, str]],
+        headers: Dict[str, str]
+    ) -> str:
+        """Cache key from path, normalized query params and varying headers"""
+        query = urlencode(sorted(query_items))
+        varying = []
+        for name in VARY_HEADERS:
+            value = headers.get(name)
+            if value is None:
+                continue
+            if name == "authorization":
+                # Keep credentials out of memory dumps; only the scope matters
+                value = hashlib.sha256(value.encode()).hexdigest()
+            varying.append(f"{name}={value}")
+        return "|".join([path, query] + varying)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def generation(self, path: str) -> int:
+        """Write generation of path's collection; read it before fetching and pass it to put"""
+        return self._generations.get(collection_of(path), 0)
+
+    def put(self, key: str, entry: CacheEntry, generation: Optional[int] = None) -> bool:
+        """Store an entry, evicting least recently used ones to stay under max_bytes.
+
+        With a generation, the entry is skipped if its collection was
+        written to since the generation was read.
+        """
+        if generation is not None and generation != self.generation(entry.path):
+            self.stale_fills += 1
+            return False
+        if entry.size > self.max_entry_bytes or entry.size > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._keys_by_path.setdefault(entry.path, set()).add(key)
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def invalidate_for_write(self, path: str) -> int:
+        """Drop entries affected by a write to path.
+
+        A write to a single resource (/products/42) drops that resource and
+        the collection-level reads (/products, /products/search, /products/batch);
+        any other write (/products/reserve-inventory) may touch arbitrary rows,
+        so the whole collection is dropped.
+        """
+        segments = [segment for segment in path.strip("/").split("/") if segment]
+        if not segments:
+            return 0
+        collection = "/" + segments[0]
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        if len(segments) >= 2 and segments[1].isdigit():
+            resource = f"{collection}/{segments[1]}"
+            paths = [
+                cached for cached in self._keys_by_path
+                if cached in (collection, collection + "/")
+                or cached == resource
+                or cached.startswith(resource + "/")
+                or (cached.startswith(collection + "/") and not cached.split("/")[2].isdigit())
+            ]
+        else:
+            paths = [
+                cached for cached in self._keys_by_path
+                if cached == collection or cached.startswith(collection + "/")
+            ]
+        removed = 0
+        for cached in paths:
+            for key in list(self._keys_by_path.get(cached, ())):
+                self._remove(key)
+                removed += 1
+        self.invalidations += removed
+        return removed
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_path.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        keys = self._keys_by_path.get(entry.path)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_path[entry.path]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "not_modified": self.not_modified,
+            "stale_fills": self.stale_fills,
+        }
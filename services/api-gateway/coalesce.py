@@ -0,0 +1,38 @@
+
+import asyncio
+from typing import Dict, Any, Callable, Awaitable
+
+
+class SingleFlight:
+    """Collapse identical concurrent calls into one and fan the result out to every caller"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            # Run the call in its own task so a disconnecting leader does not cancel it for the followers
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._calls),
+        }
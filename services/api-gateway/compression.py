@@ -0,0 +1,175 @@
+
+import re
+import time
+import zlib
+from typing import Dict, Any, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "text/",
+)
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def route_template(path: str) -> str:
+    """Collapse numeric path segments so stats group by route, not by resource"""
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class CompressionStats:
+    """Bytes in/out and time spent compressing, per route template"""
+
+    def __init__(self, max_routes: int = 256):
+        self.max_routes = max_routes
+        self.routes: Dict[str, Dict[str, float]] = {}
+
+    def record(self, route: str, bytes_in: int, bytes_out: int, seconds: float):
+        if route not in self.routes and len(self.routes) >= self.max_routes:
+            route = "other"
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+        stats["responses"] += 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        stats["seconds"] += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        result = {}
+        for route, stats in self.routes.items():
+            saved = stats["bytes_in"] - stats["bytes_out"]
+            result[route] = {
+                "responses": stats["responses"],
+                "bytes_in": stats["bytes_in"],
+                "bytes_out": stats["bytes_out"],
+                "bytes_saved": saved,
+                "ratio": round(stats["bytes_out"] / stats["bytes_in"], 4) if stats["bytes_in"] else None,
+                "cpu_ms": round(stats["seconds"] * 1000, 3),
+                "us_per_kb_saved": round(stats["seconds"] * 1e6 / (saved / 1024), 3) if saved > 0 else None,
+            }
+        return result
+
+
+class CompressionMiddleware:
+    """Streaming gzip for responses the client accepts it for.
+
+    Bodies below minimum_size and bodies the upstream already encoded pass
+    through untouched; chunks are compressed as they arrive so streamed
+    responses are never buffered in full.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, level: int = 6, stats: Optional[CompressionStats] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        if not accepts_gzip(Headers(scope=scope).get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+        responder = _GzipResponder(self, send, route_template(scope["path"]))
+        await self.app(scope, receive, responder.send)
+
+
+class _GzipResponder:
+    def __init__(self, middleware: CompressionMiddleware, send: Send, route: str):
+        self.middleware = middleware
+        self.downstream = send
+        self.route = route
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.pending = b""
+        self.compressor = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            content_length = headers.get("content-length")
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] < 200
+                or message["status"] in (204, 304)
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                or (content_length is not None and int(content_length) < self.middleware.minimum_size)
+            )
+            if self.passthrough:
+                await self.downstream(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            self.pending += body
+            if len(self.pending) < self.middleware.minimum_size:
+                if more_body:
+                    return
+                # Whole body turned out to be small: send it as is
+                self.passthrough = True
+                await self.downstream(self.start)
+                await self.downstream({"type": "http.response.body", "body": self.pending, "more_body": False})
+                return
+            await self._begin()
+            body, self.pending = self.pending, b""
+
+        await self._write(body, more_body)
+
+    async def _begin(self):
+        headers = MutableHeaders(raw=self.start["headers"])
+        if "content-length" in headers:
+            del headers["content-length"]
+        headers["content-encoding"] = "gzip"
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The gzip bytes differ from the identity representation
+            headers["etag"] = "W/" + etag
+        self.compressor = zlib.compressobj(self.middleware.level, zlib.DEFLATED, 31)
+        await self.downstream(self.start)
+
+    async def _write(self, body: bytes, more_body: bool):
+        started = time.perf_counter()
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        self.seconds += time.perf_counter() - started
+        self.bytes_in += len(body)
+        self.bytes_out += len(data)
+
+        if data or not more_body:
+            await self.downstream({"type": "http.response.body", "body": data, "more_body": more_body})
+        if not more_body:
+            self.middleware.stats.record(self.route, self.bytes_in, self.bytes_out, self.seconds)
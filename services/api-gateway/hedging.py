@@ -0,0 +1,86 @@
+
+import os
+from collections import deque
+from typing import Dict, Any, Optional
+
+
+class HedgePolicy:
+    """When to send a second copy of a slow idempotent read.
+
+    The hedge delay is a percentile of recent GET latencies for the service,
+    so only the slow tail gets hedged. Each request earns `budget` tokens and
+    a hedge spends one, which caps the extra upstream load at roughly that
+    fraction (plus a small burst).
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        budget: float = 0.05,
+        burst: float = 10.0,
+        min_delay: float = 0.005,
+        window: int = 1000,
+        min_samples: int = 20,
+        recompute_every: int = 50
+    ):
+        if not 0 < percentile < 1:
+            raise ValueError("Hedge percentile must be between 0 and 1")
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.recompute_every = recompute_every
+        self.samples: "deque[float]" = deque(maxlen=window)
+        self.tokens = 0.0
+        self.requests = 0
+        self.over_budget = 0
+        self._delay: Optional[float] = None
+        self._since_recompute = 0
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        return cls(
+            percentile=float(os.getenv("GATEWAY_HEDGE_PERCENTILE", "0.95")),
+            budget=float(os.getenv("GATEWAY_HEDGE_BUDGET", "0.05")),
+            burst=float(os.getenv("GATEWAY_HEDGE_BURST", "10")),
+            min_delay=float(os.getenv("GATEWAY_HEDGE_MIN_DELAY", "0.005")),
+            window=int(os.getenv("GATEWAY_HEDGE_WINDOW", "1000")),
+        )
+
+    def observe(self, latency: float):
+        """Record the latency of a completed GET attempt"""
+        self.samples.append(latency)
+        self._since_recompute += 1
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None until there are enough samples"""
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._delay is None or self._since_recompute >= self.recompute_every:
+            ordered = sorted(self.samples)
+            self._delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+            self._since_recompute = 0
+        return max(self.min_delay, self._delay)
+
+    def start(self):
+        """Count a hedge-eligible request, earning budget for future hedges"""
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.budget)
+
+    def try_hedge(self) -> bool:
+        if self.tokens < 1.0:
+            self.over_budget += 1
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.delay()
+        return {
+            "delay_ms": round(delay * 1000, 3) if delay is not None else None,
+            "samples": len(self.samples),
+            "requests": self.requests,
+            "tokens": round(self.tokens, 3),
+            "over_budget": self.over_budget,
+        }
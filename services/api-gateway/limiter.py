@@ -0,0 +1,159 @@
+
+import os
+import time
+import logging
+from typing import Dict, Any, Optional
+from pools import PoolSettings
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(service_type: str, key: str, default) -> str:
+    """<SERVICE>_<KEY> env var, falling back to GATEWAY_<KEY>"""
+    fallback = os.getenv(f"GATEWAY_{key}", str(default))
+    return os.getenv(f"{service_type.upper()}_{key}", fallback)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: grow by ~1 per window of good responses, shrink on slow or failed ones"""
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        latency_target: float = 1.0,
+        backoff_ratio: float = 0.9
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, service_type: str, pool: Optional[PoolSettings] = None) -> "AdaptiveLimiter":
+        """Starts at the upstream pool's connection limit unless LIMIT_INITIAL is set, so a cold
+        gateway admits what the pool can carry and AIMD only has to shrink the limit"""
+        max_limit = int(_setting(service_type, "LIMIT_MAX", 200))
+        initial_limit = min(pool.max_connections, max_limit) if pool is not None else max_limit
+        return cls(
+            initial_limit=int(_setting(service_type, "LIMIT_INITIAL", initial_limit)),
+            min_limit=int(_setting(service_type, "LIMIT_MIN", 1)),
+            max_limit=max_limit,
+            latency_target=float(_setting(service_type, "LIMIT_LATENCY_TARGET", 1.0)),
+            backoff_ratio=float(_setting(service_type, "LIMIT_BACKOFF_RATIO", 0.9)),
+        )
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float, ok: bool):
+        """Return a slot and adjust the limit from the request outcome"""
+        self.in_flight = max(0, self.in_flight - 1)
+        if not ok or latency > self.latency_target:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        elif self.in_flight * 2 >= self.limit:
+            # Only grow while the limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def release_unused(self):
+        """Return a slot without a latency sample (request never sent)"""
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "latency_target": self.latency_target,
+        }
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by consecutive upstream failures"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.rejected = 0
+        self.trips = 0
+
+    @classmethod
+    def from_env(cls, service_type: str) -> "CircuitBreaker":
+        return cls(
+            failure_threshold=int(_setting(service_type, "BREAKER_FAILURES", 5)),
+            reset_timeout=float(_setting(service_type, "BREAKER_RESET_TIMEOUT", 10.0)),
+            half_open_probes=int(_setting(service_type, "BREAKER_HALF_OPEN_PROBES", 1)),
+        )
+
+    def retry_after(self) -> int:
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        return max(1, int(remaining + 0.999))
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self.probes_in_flight = 0
+        if self.state == self.HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self.probes_in_flight += 1
+        return True
+
+    def record(self, ok: bool):
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if ok:
+                logger.info("Circuit closed after successful probe")
+                self.state = self.CLOSED
+                self.consecutive_failures = 0
+            else:
+                self._trip()
+            return
+
+        if ok:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._trip()
+
+    def abandon(self):
+        """Release a half-open probe slot for an attempt cancelled before it finished"""
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+            "trips": self.trips,
+            "retry_after": self.retry_after() if self.state == self.OPEN else None,
+        }
@@ -0,0 +1,234 @@
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Upper bounds in seconds; a final +Inf bucket is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+
+def label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe is one bisect and three increments"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str, lines: List[str]):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+
+
+class RouteSeries:
+    """Counters for one service/route template pair"""
+
+    __slots__ = ("latency", "statuses", "request_bytes", "response_bytes", "in_flight")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = [0] * len(STATUS_CLASSES)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.in_flight = 0
+
+    def record(self, status: int, seconds: float, request_bytes: int, response_bytes: int):
+        self.latency.observe(seconds)
+        index = status // 100 - 1
+        self.statuses[index if 0 <= index < 5 else 4] += 1
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+
+
+class UpstreamSeries:
+    """Latency and outcome of attempts against one upstream service"""
+
+    __slots__ = ("latency", "errors", "in_flight", "hedges", "hedges_won")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.in_flight = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+
+class GatewayMetrics:
+    """Per-route and per-upstream series, rendered in Prometheus text format"""
+
+    def __init__(self, max_routes: int = 256):
+        self.max_routes = max_routes
+        self.routes: Dict[Tuple[str, str], RouteSeries] = {}
+        self.upstreams: Dict[str, UpstreamSeries] = {}
+
+    def route(self, service: str, template: str) -> RouteSeries:
+        key = (service, template)
+        series = self.routes.get(key)
+        if series is None:
+            if len(self.routes) >= self.max_routes:
+                # Keep label cardinality bounded when paths carry non-numeric ids
+                key = (service, "other")
+                series = self.routes.get(key)
+            if series is None:
+                series = self.routes[key] = RouteSeries()
+        return series
+
+    def upstream(self, service: str) -> UpstreamSeries:
+        series = self.upstreams.get(service)
+        if series is None:
+            series = self.upstreams[service] = UpstreamSeries()
+        return series
+
+    def render(self) -> str:
+        lines: List[str] = []
+        routes = [
+            ((label_value(service), label_value(route)), series)
+            for (service, route), series in sorted(self.routes.items())
+        ]
+        upstreams = sorted(self.upstreams.items())
+
+        lines.append("# HELP gateway_requests_total Client requests by upstream service, route and status class")
+        lines.append("# TYPE gateway_requests_total counter")
+        for (service, route), series in routes:
+            for status_class, count in zip(STATUS_CLASSES, series.statuses):
+                if count:
+                    lines.append(
+                        f'gateway_requests_total{{service="{service}",route="{route}",code="{status_class}"}} {count}'
+                    )
+
+        lines.append("# HELP gateway_request_duration_seconds Time from request start to last response byte")
+        lines.append("# TYPE gateway_request_duration_seconds histogram")
+        for (service, route), series in routes:
+            series.latency.render("gateway_request_duration_seconds", f'service="{service}",route="{route}"', lines)
+
+        lines.append("# HELP gateway_request_bytes_total Request body bytes received from clients")
+        lines.append("# TYPE gateway_request_bytes_total counter")
+        for (service, route), series in routes:
+            lines.append(f'gateway_request_bytes_total{{service="{service}",route="{route}"}} {series.request_bytes}')
+
+        lines.append("# HELP gateway_response_bytes_total Response body bytes sent to clients")
+        lines.append("# TYPE gateway_response_bytes_total counter")
+        for (service, route), series in routes:
+            lines.append(f'gateway_response_bytes_total{{service="{service}",route="{route}"}} {series.response_bytes}')
+
+        lines.append("# HELP gateway_requests_in_flight Client requests currently being served")
+        lines.append("# TYPE gateway_requests_in_flight gauge")
+        for (service, route), series in routes:
+            lines.append(f'gateway_requests_in_flight{{service="{service}",route="{route}"}} {series.in_flight}')
+
+        lines.append("# HELP gateway_upstream_duration_seconds Time until upstream response headers, per attempt")
+        lines.append("# TYPE gateway_upstream_duration_seconds histogram")
+        for service, series in upstreams:
+            series.latency.render("gateway_upstream_duration_seconds", f'service="{service}"', lines)
+
+        lines.append("# HELP gateway_upstream_errors_total Upstream attempts that failed or returned 5xx")
+        lines.append("# TYPE gateway_upstream_errors_total counter")
+        for service, series in upstreams:
+            lines.append(f'gateway_upstream_errors_total{{service="{service}"}} {series.errors}')
+
+        lines.append("# HELP gateway_upstream_in_flight Upstream attempts currently outstanding")
+        lines.append("# TYPE gateway_upstream_in_flight gauge")
+        for service, series in upstreams:
+            lines.append(f'gateway_upstream_in_flight{{service="{service}"}} {series.in_flight}')
+
+        lines.append("# HELP gateway_hedges_total Hedged second attempts sent for slow GETs")
+        lines.append("# TYPE gateway_hedges_total counter")
+        for service, series in upstreams:
+            lines.append(f'gateway_hedges_total{{service="{service}"}} {series.hedges}')
+
+        lines.append("# HELP gateway_hedges_won_total Hedged attempts that answered before the original")
+        lines.append("# TYPE gateway_hedges_won_total counter")
+        for service, series in upstreams:
+            lines.append(f'gateway_hedges_won_total{{service="{service}"}} {series.hedges_won}')
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Record latency, bytes and status for requests that resolve to an upstream route.
+
+    Sits outside compression so byte counts are what actually went over
+    the wire. resolve maps a path to (service, route template), or None
+    for gateway-local endpoints, which are not recorded.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        metrics: GatewayMetrics,
+        resolve: Callable[[str], Optional[Tuple[str, str]]]
+    ):
+        self.app = app
+        self.metrics = metrics
+        self.resolve = resolve
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        labels = self.resolve(scope["path"])
+        if labels is None:
+            await self.app(scope, receive, send)
+            return
+
+        recorder = _Recorder(self.metrics.route(*labels), send)
+        # Bodyless requests skip the receive wrapper entirely
+        if scope["method"] in BODY_METHODS:
+            receive = recorder.wrap_receive(receive)
+        try:
+            await self.app(scope, receive, recorder.send)
+        finally:
+            recorder.finish()
+
+
+class _Recorder:
+    __slots__ = ("series", "downstream", "started", "status", "received", "sent")
+
+    def __init__(self, series: RouteSeries, send: Send):
+        series.in_flight += 1
+        self.series = series
+        self.downstream = send
+        self.started = time.perf_counter()
+        self.status = 500
+        self.received = 0
+        self.sent = 0
+
+    def wrap_receive(self, receive: Receive) -> Receive:
+        async def counting_receive() -> Message:
+            message = await receive()
+            self.received += len(message.get("body", b""))
+            return message
+        return counting_receive
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.body":
+            self.sent += len(message.get("body", b""))
+        elif message["type"] == "http.response.start":
+            self.status = message["status"]
+        await self.downstream(message)
+
+    def finish(self):
+        self.series.in_flight -= 1
+        self.series.record(self.status, time.perf_counter() - self.started, self.received, self.sent)
@@ -0,0 +1,122 @@
+
+import os
+import httpx
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSettings:
+    """Keep-alive limits and timeout for one upstream service"""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+    @classmethod
+    def from_env(cls, service_type: str, defaults: Optional[Dict[str, Any]] = None) -> "PoolSettings":
+        """Read settings from <SERVICE>_POOL_* env vars, falling back to GATEWAY_POOL_*, then defaults"""
+        prefix = service_type.upper()
+        defaults = defaults or {}
+
+        def lookup(key: str, default):
+            fallback = os.getenv(f"GATEWAY_POOL_{key}", str(defaults.get(key.lower(), default)))
+            return os.getenv(f"{prefix}_POOL_{key}", fallback)
+
+        return cls(
+            max_connections=int(lookup("MAX_CONNECTIONS", 100)),
+            max_keepalive=int(lookup("MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(lookup("KEEPALIVE_EXPIRY", 30.0)),
+            timeout=float(lookup("TIMEOUT", 30.0)),
+            connect_timeout=float(lookup("CONNECT_TIMEOUT", 5.0)),
+        )
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PoolSettings) and self.as_dict() == other.as_dict()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "keepalive_expiry": self.keepalive_expiry,
+            "timeout": self.timeout,
+            "connect_timeout": self.connect_timeout,
+        }
+
+
+class UpstreamPools:
+    """One long-lived httpx.AsyncClient per upstream service"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._settings: Dict[str, PoolSettings] = {}
+
+    def open(self, service_type: str, settings: Optional[PoolSettings] = None) -> Optional[httpx.AsyncClient]:
+        """Create the pooled client for a service, returning the client it replaces (if any)"""
+        settings = settings or PoolSettings.from_env(service_type)
+        limits = httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive,
+            keepalive_expiry=settings.keepalive_expiry,
+        )
+        timeout = httpx.Timeout(settings.timeout, connect=settings.connect_timeout)
+        previous = self._clients.get(service_type)
+        self._clients[service_type] = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._settings[service_type] = settings
+        logger.info(f"Opened connection pool for {service_type}: {settings.as_dict()}")
+        return previous
+
+    def settings(self, service_type: str) -> Optional[PoolSettings]:
+        return self._settings.get(service_type)
+
+    def detach(self, service_type: str) -> Optional[httpx.AsyncClient]:
+        """Stop handing out a service's client and return it so the caller can close it"""
+        self._settings.pop(service_type, None)
+        return self._clients.pop(service_type, None)
+
+    async def close(self):
+        """Close every pooled client"""
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for service_type, client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing connection pool for {service_type}: {e}")
+
+    def client(self, service_type: str) -> httpx.AsyncClient:
+        client = self._clients.get(service_type)
+        if client is None:
+            raise RuntimeError(f"No connection pool open for service '{service_type}'")
+        return client
+
+    def stats(self) -> Dict[str, Any]:
+        """Active/idle connection counts per service"""
+        result = {}
+        for service_type, client in self._clients.items():
+            connections = _pool_connections(client)
+            idle = sum(1 for conn in connections if conn.is_idle())
+            result[service_type] = {
+                "connections": len(connections),
+                "active": len(connections) - idle,
+                "idle": idle,
+                "limits": self._settings[service_type].as_dict(),
+            }
+        return result
+
+
+def _pool_connections(client: httpx.AsyncClient) -> list:
+    # httpx does not expose its connection pool publicly, so read it off the transport
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []))
@@ -0,0 +1,108 @@
+
+import httpx
+import logging
+from typing import List, Tuple, Iterable, Optional
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# Connection-level headers that must not be forwarded by a proxy (RFC 7230 section 6.1)
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+})
+
+
+def _connection_tokens(headers: Iterable[Tuple[str, str]]) -> set:
+    """Extra hop-by-hop header names listed in the Connection header"""
+    tokens = set()
+    for key, value in headers:
+        if key.lower() == "connection":
+            tokens.update(token.strip().lower() for token in value.split(",") if token.strip())
+    return tokens
+
+
+def filter_request_headers(headers: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Drop host and hop-by-hop headers from a client request"""
+    headers = list(headers)
+    excluded = HOP_BY_HOP_HEADERS | _connection_tokens(headers) | {"host"}
+    return [(key, value) for key, value in headers if key.lower() not in excluded]
+
+
+def filter_response_headers(
+    headers: Iterable[Tuple[str, str]],
+    decoded: bool = False,
+    exclude: Optional[set] = None
+) -> List[Tuple[str, str]]:
+    """Drop hop-by-hop headers from an upstream response.
+
+    When the body has already been decoded by httpx, content-encoding and
+    content-length no longer describe it and are dropped as well.
+    """
+    headers = list(headers)
+    excluded = HOP_BY_HOP_HEADERS | _connection_tokens(headers)
+    if decoded:
+        excluded = excluded | {"content-encoding", "content-length"}
+    if exclude:
+        excluded = excluded | exclude
+    return [(key, value) for key, value in headers if key.lower() not in excluded]
+
+
+def _raw_headers(headers: List[Tuple[str, str]]) -> List[Tuple[bytes, bytes]]:
+    return [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers]
+
+
+def stream_response(upstream: httpx.Response) -> StreamingResponse:
+    """Relay an upstream response to the client chunk by chunk, without decoding it"""
+    async def body():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        except httpx.HTTPError as e:
+            logger.error(f"Upstream stream interrupted for {upstream.request.url}: {e}")
+        finally:
+            await upstream.aclose()
+
+    response = StreamingResponse(
+        body(),
+        status_code=upstream.status_code,
+        background=BackgroundTask(upstream.aclose)
+    )
+    # Raw bytes are relayed untouched, so content-length/content-encoding stay valid
+    response.raw_headers.extend(_raw_headers(filter_response_headers(upstream.headers.multi_items())))
+    return response
+
+
+def buffered_response(upstream: httpx.Response) -> Response:
+    """Build a client response from a fully read upstream response"""
+    response = Response(content=upstream.content, status_code=upstream.status_code)
+    existing = {key for key, _ in response.raw_headers}
+    headers = _raw_headers(filter_response_headers(upstream.headers.multi_items(), decoded=True))
+    response.raw_headers.extend((key, value) for key, value in headers if key not in existing)
+    return response
+
+
+def cache_entry_response(entry, cache_status: str, ttl: float, not_modified: bool = False) -> Response:
+    """Build a client response (or a 304) from a cached entry"""
+    if not_modified:
+        response = Response(status_code=304)
+    else:
+        response = Response(content=entry.body, status_code=entry.status_code)
+        existing = {key for key, _ in response.raw_headers}
+        headers = _raw_headers(entry.headers)
+        response.raw_headers.extend((key, value) for key, value in headers if key not in existing)
+    response.headers["etag"] = entry.etag
+    response.headers["age"] = str(entry.age())
+    response.headers["x-cache"] = cache_status
+    if "cache-control" not in response.headers:
+        response.headers["cache-control"] = f"max-age={int(ttl)}"
+    return response
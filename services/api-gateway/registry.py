@@ -0,0 +1,180 @@
+
+import os
+import json
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+from pools import PoolSettings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHODS = ("GET", "POST", "PUT", "DELETE")
+
+
+class RegistryError(ValueError):
+    """Invalid service registry / route table"""
+
+
+def normalize_urls(urls: List[str]) -> List[str]:
+    return [url.strip().rstrip("/") for url in urls if url.strip()]
+
+
+class ServiceConfig:
+    """An upstream service: its replicas and connection pool settings"""
+
+    def __init__(self, name: str, urls: List[str], pool: PoolSettings):
+        self.name = name
+        self.urls = urls
+        self.pool = pool
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> "ServiceConfig":
+        urls = data.get("urls") or []
+        if isinstance(urls, str):
+            urls = [urls]
+        urls = normalize_urls(urls)
+        # <SERVICE>_SERVICE_URLS / <SERVICE>_SERVICE_URL only fill in a service the file lists no
+        # URLs for, so instance edits in the file take effect on reload
+        prefix = name.upper()
+        env_urls = normalize_urls((os.getenv(f"{prefix}_SERVICE_URLS") or os.getenv(f"{prefix}_SERVICE_URL") or "").split(","))
+        if not urls:
+            urls = env_urls
+        elif env_urls and env_urls != urls:
+            logger.warning(f"{prefix}_SERVICE_URL(S) ignored for '{name}': the route file lists {', '.join(urls)}")
+        if not urls:
+            raise RegistryError(f"Service '{name}' has no instance URLs")
+        return cls(name, urls, PoolSettings.from_env(name, data.get("pool")))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"urls": self.urls, "pool": self.pool.as_dict()}
+
+
+class Route:
+    """A path prefix mapped to an upstream service and its per-route policy"""
+
+    __slots__ = (
+        "prefix", "service", "rewrite", "methods", "timeout",
+        "cache_ttl", "coalesce", "retries", "hedge", "_prefix_slash",
+    )
+
+    def __init__(
+        self,
+        prefix: str,
+        service: str,
+        rewrite: Optional[str] = None,
+        methods: Tuple[str, ...] = DEFAULT_METHODS,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[float] = None,
+        coalesce: bool = False,
+        retries: int = 0,
+        hedge: bool = False
+    ):
+        self.prefix = "/" + prefix.strip("/")
+        self.service = service
+        self.rewrite = rewrite
+        self.methods = frozenset(method.upper() for method in methods)
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl if cache_ttl and cache_ttl > 0 else None
+        self.coalesce = coalesce
+        self.retries = retries
+        self.hedge = hedge
+        self._prefix_slash = self.prefix.rstrip("/") + "/"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Route":
+        try:
+            return cls(
+                prefix=data["prefix"],
+                service=data["service"],
+                rewrite=data.get("rewrite"),
+                methods=tuple(data.get("methods", DEFAULT_METHODS)),
+                timeout=data.get("timeout"),
+                cache_ttl=data.get("cache_ttl"),
+                coalesce=bool(data.get("coalesce", False)),
+                retries=int(data.get("retries", 0)),
+                hedge=bool(data.get("hedge", False)),
+            )
+        except KeyError as e:
+            raise RegistryError(f"Route {data!r} is missing {e}")
+
+    def matches(self, path: str) -> bool:
+        return path == self.prefix or path.startswith(self._prefix_slash) or self.prefix == "/"
+
+    def upstream_path(self, path: str) -> str:
+        if self.rewrite is None:
+            return path
+        rest = path[len(self.prefix):] if self.prefix != "/" else path
+        return (self.rewrite.rstrip("/") + rest) or "/"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "prefix": self.prefix,
+            "service": self.service,
+            "rewrite": self.rewrite,
+            "methods": sorted(self.methods),
+            "timeout": self.timeout,
+            "cache_ttl": self.cache_ttl,
+            "coalesce": self.coalesce,
+            "retries": self.retries,
+            "hedge": self.hedge,
+        }
+
+
+class Registry:
+    """Immutable service registry plus a precompiled prefix route table.
+
+    Routes are bucketed by first path segment, longest prefix first, so a
+    lookup is one dict access and a handful of startswith checks. A reload
+    builds a new Registry and swaps the reference; requests already routed
+    keep the Route they matched.
+    """
+
+    def __init__(self, services: Dict[str, ServiceConfig], routes: List[Route], source: str = ""):
+        for route in routes:
+            if route.service not in services:
+                raise RegistryError(f"Route {route.prefix} points at unknown service '{route.service}'")
+        self.services = services
+        self.routes = routes
+        self.source = source
+        self._by_segment: Dict[str, List[Route]] = {}
+        self._fallback: List[Route] = []
+        for route in sorted(routes, key=lambda route: len(route.prefix), reverse=True):
+            segment = route.prefix.strip("/").split("/", 1)[0]
+            if segment:
+                self._by_segment.setdefault(segment, []).append(route)
+            else:
+                self._fallback.append(route)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], source: str = "") -> "Registry":
+        try:
+            services = {
+                name: ServiceConfig.from_dict(name, service)
+                for name, service in data.get("services", {}).items()
+            }
+            routes = [Route.from_dict(route) for route in data.get("routes", [])]
+        except (TypeError, ValueError, AttributeError) as e:
+            raise RegistryError(str(e))
+        return cls(services, routes, source)
+
+    @classmethod
+    def from_file(cls, path: str) -> "Registry":
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise RegistryError(f"Cannot load route table {path}: {e}")
+        return cls.from_dict(data, source=path)
+
+    def match(self, path: str) -> Optional[Route]:
+        segment = path[1:].split("/", 1)[0]
+        for route in self._by_segment.get(segment, ()):
+            if route.matches(path):
+                return route
+        return self._fallback[0] if self._fallback else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "services": {name: service.as_dict() for name, service in self.services.items()},
+            "routes": [route.as_dict() for route in self.routes],
+        }
@@ -0,0 +1,27 @@
+
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+    deadline_ms: Optional[int] = Field(default=None, gt=0)
+
+
+class BatchItemResult(BaseModel):
+    id: Optional[str]
+    status: int
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResult]
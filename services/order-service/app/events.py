@@ -52,10 +52,9 @@ async def consume_inventory_events():
                     data = json.loads(message.body.decode())
                     logger.info(f"Received inventory event: {data}")
                     
-                    db = SessionLocal()
-                    try:
+                    async with SessionLocal() as db:
                         order_id = data.get("order_id")
-                        order = db.query(Order).filter(Order.id == order_id).first()
+                        order = await db.get(Order, order_id)
                         
                         if not order:
                             logger.error(f"Order {order_id} not found")
@@ -64,18 +63,17 @@ async def consume_inventory_events():
                         if message.routing_key == "inventory.reserved":
                             # Update order status to confirmed
                             order.status = "confirmed"
-                            db.commit()
+                            await db.commit()
                             logger.info(f"Order {order_id} confirmed")
+                            # Lets product-service turn the order's inventory holds permanent
+                            await publish_event("order.confirmed", {"order_id": order_id})
                             
                         elif message.routing_key == "inventory.failed":
                             # Update order status to cancelled
                             order.status = "cancelled"
-                            db.commit()
+                            await db.commit()
                             logger.info(f"Order {order_id} cancelled: {data.get('reason', 'Unknown reason')}")
                     
-                    finally:
-                        db.close()
-                    
                 except Exception as e:
                     logger.error(f"Error processing inventory event: {e}")
         
@@ -3,15 +3,12 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from . import models, routes, events
-from .db import engine
+from .db import engine, pool_status
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Order Service",
     description="Order processing and management",
@@ -43,7 +40,21 @@ async def health_check():
     return {"status": "ok", "service": "order-service"}
 
 
+@app.get("/db/pool")
+async def db_pool():
+    """Database connection pool occupancy and checkout wait times"""
+    return pool_status()
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Start event consumer on startup"""
+    """Create database tables and start event consumer on startup"""
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
     await events.start_event_consumer()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the database pool"""
+    await engine.dispose()
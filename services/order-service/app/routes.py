@@ -1,13 +1,24 @@
 
+import hmac
 import httpx
 import os
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
 from . import models, schemas, db, events
 
 router = APIRouter()
 
+# Identity headers are only trusted alongside this secret, which the API gateway sends
+GATEWAY_IDENTITY_TOKEN = os.getenv("GATEWAY_IDENTITY_TOKEN", "")
+
+
+def order_query():
+    """Orders with their items loaded eagerly; async sessions cannot lazy-load"""
+    return select(models.Order).options(selectinload(models.Order.items))
+
 
 async def get_user_from_token(token: str) -> dict:
     
@@ -31,46 +42,73 @@ async def get_user_from_token(token: str) -> dict:
         )
 
 
+def from_gateway(x_gateway_token: Optional[str]) -> bool:
+    """Whether a request carries the gateway's shared secret; never true while it is unset"""
+    return bool(GATEWAY_IDENTITY_TOKEN) and x_gateway_token is not None and hmac.compare_digest(
+        x_gateway_token.encode(), GATEWAY_IDENTITY_TOKEN.encode()
+    )
+
+
+async def get_current_user_id(
+    x_user_id: Optional[int] = Header(None),
+    x_gateway_token: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None)
+) -> Optional[int]:
+    """Caller's user id, preferring the identity header set by the API gateway"""
+    # The gateway verifies the JWT and strips client-supplied X-User-* headers;
+    # direct callers must present a token that user-service accepts
+    if x_user_id is not None and from_gateway(x_gateway_token):
+        return x_user_id
+    if authorization and authorization.lower().startswith("bearer "):
+        user = await get_user_from_token(authorization[7:])
+        return user["id"]
+    return None
+
+
 async def get_product_prices(items: List[schemas.OrderItemCreate]) -> List[dict]:
-    
+    """Prices of the ordered products, fetched in one batch request"""
+    product_ids = ",".join(str(item.product_id) for item in items)
     try:
         async with httpx.AsyncClient() as client:
-            product_prices = {}
-            for item in items:
-                response = await client.get(
-                    f"{os.getenv('PRODUCT_SERVICE_URL', 'http://localhost:8002')}/products/{item.product_id}"
-                )
-                if response.status_code == 200:
-                    product_data = response.json()
-                    product_prices[item.product_id] = product_data["price"]
-                else:
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail=f"Product {item.product_id} not found"
-                    )
-            return product_prices
+            response = await client.get(
+                f"{os.getenv('PRODUCT_SERVICE_URL', 'http://localhost:8002')}/products/batch",
+                params={"ids": product_ids, "fields": "id,price"}
+            )
     except httpx.RequestError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Product service unavailable"
         )
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Product service unavailable"
+        )
+    batch = response.json()
+    if batch["missing"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product {batch['missing'][0]} not found"
+        )
+    return {product["id"]: product["price"] for product in batch["products"]}
 
 
 @router.post("/", response_model=schemas.OrderResponse)
 async def create_order(
     order: schemas.OrderCreate,
-    db_session: Session = Depends(db.get_db)
+    db_session: AsyncSession = Depends(db.get_db),
+    current_user_id: Optional[int] = Depends(get_current_user_id)
 ):
     """Create a new order"""
-    existing_order = db_session.query(models.Order).filter(
-        models.Order.idempotency_key == order.idempotency_key
-    ).first()
+    existing_order = await db_session.scalar(
+        order_query().where(models.Order.idempotency_key == order.idempotency_key)
+    )
     
     if existing_order:
         return existing_order
     
     
-    user_id = 1  
+    user_id = current_user_id if current_user_id is not None else 1
     
     
     product_prices = await get_product_prices(order.items)
@@ -89,8 +127,8 @@ async def create_order(
         idempotency_key=order.idempotency_key
     )
     db_session.add(db_order)
-    db_session.commit()
-    db_session.refresh(db_order)
+    await db_session.commit()
+    await db_session.refresh(db_order)
     
   
     for item in order.items:
@@ -102,8 +140,8 @@ async def create_order(
         )
         db_session.add(db_item)
     
-    db_session.commit()
-    db_session.refresh(db_order)
+    await db_session.commit()
+    await db_session.refresh(db_order, attribute_names=["items"])
     
     
     await events.publish_event("order.created", {
@@ -118,9 +156,9 @@ async def create_order(
 
 
 @router.get("/{order_id}", response_model=schemas.OrderResponse)
-async def get_order(order_id: int, db_session: Session = Depends(db.get_db)):
+async def get_order(order_id: int, db_session: AsyncSession = Depends(db.get_db)):
     """Get order by ID"""
-    order = db_session.query(models.Order).filter(models.Order.id == order_id).first()
+    order = await db_session.scalar(order_query().where(models.Order.id == order_id))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -134,14 +172,14 @@ async def list_orders(
     user_id: int = None,
     skip: int = 0,
     limit: int = 100,
-    db_session: Session = Depends(db.get_db)
+    db_session: AsyncSession = Depends(db.get_db)
 ):
     
-    query = db_session.query(models.Order)
+    query = order_query()
     if user_id:
-        query = query.filter(models.Order.user_id == user_id)
+        query = query.where(models.Order.user_id == user_id)
     
-    orders = query.offset(skip).limit(limit).all()
+    orders = (await db_session.scalars(query.offset(skip).limit(limit))).all()
     return orders
 
 
@@ -149,22 +187,27 @@ async def list_orders(
 async def update_order(
     order_id: int,
     order_update: schemas.OrderUpdate,
-    db_session: Session = Depends(db.get_db)
+    db_session: AsyncSession = Depends(db.get_db)
 ):
    
-    order = db_session.query(models.Order).filter(models.Order.id == order_id).first()
+    order = await db_session.scalar(order_query().where(models.Order.id == order_id))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
     
+    previous_status = order.status
     update_data = order_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(order, field, value)
     
-    db_session.commit()
-    db_session.refresh(order)
+    await db_session.commit()
+    await db_session.refresh(order, attribute_names=["status", "updated_at"])
+    
+    # Product service confirms or releases the order's inventory holds
+    if order.status != previous_status and order.status in ("confirmed", "cancelled"):
+        await events.publish_event(f"order.{order.status}", {"order_id": order.id})
     return order
 
 
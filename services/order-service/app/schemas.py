@@ -23,7 +23,7 @@ class OrderItemResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
+        orm_mode = True
 
 
 class OrderResponse(BaseModel):
@@ -37,7 +37,7 @@ class OrderResponse(BaseModel):
     items: List[OrderItemResponse]
 
     class Config:
-        from_attributes = True
+        orm_mode = True
 
 
 class OrderUpdate(BaseModel):
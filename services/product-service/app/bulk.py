@@ -0,0 +1,231 @@
+
+import io
+import os
+import csv
+import json
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, cache, inventory
+from .db import SessionLocal
+
+UPSERT_CHUNK_SIZE = int(os.getenv("PRODUCT_UPSERT_CHUNK_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("PRODUCT_EXPORT_BATCH_SIZE", "5000"))
+EXPORT_FIELDS = list(schemas.ProductResponse.__fields__)
+# Results past this size spill from memory to a temporary file
+RESULTS_MEMORY_BYTES = 1024 * 1024
+
+
+async def body_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """(line number, text) for each line of a streamed request body, holding one partial line at most"""
+    pending = b""
+    line_no = 0
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line.decode("utf-8", errors="replace").rstrip("\r")
+    if pending:
+        yield line_no + 1, pending.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def ndjson_records(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[Tuple[int, Any]]:
+    """(line number, decoded value) for each non-blank NDJSON line"""
+    async for line_no, line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+
+
+async def csv_records(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[Tuple[int, Any]]:
+    """(line number, row dict) for each CSV record; the first line is the header"""
+    header = None
+    record: List[str] = []
+    start = 0
+    async for line_no, line in lines:
+        if not record:
+            start = line_no
+            if not line.strip():
+                continue
+        record.append(line)
+        # An odd number of quotes means a quoted field continues on the next line
+        if "\n".join(record).count('"') % 2:
+            continue
+        row = next(csv.reader(["\n".join(record)]))
+        record = []
+        if header is None:
+            header = [name.strip() for name in row]
+            continue
+        if len(row) != len(header):
+            yield start, ValueError(f"expected {len(header)} columns, got {len(row)}")
+        else:
+            yield start, dict(zip(header, row))
+    if record:
+        yield start, ValueError("unterminated quoted field")
+
+
+def result(row: int, status: str, **fields) -> bytes:
+    return json.dumps({"row": row, "status": status, **fields}).encode() + b"\n"
+
+
+class ProductUpserter:
+    """Upsert a catalog feed in chunks of one existence query, one multi-row insert and one
+    executemany update, each chunk in its own transaction"""
+
+    def __init__(self, db_session: AsyncSession, chunk_size: int = UPSERT_CHUNK_SIZE):
+        self.db_session = db_session
+        self.chunk_size = chunk_size
+        self.counts = {"created": 0, "updated": 0, "invalid": 0, "failed": 0}
+        # Per-row errors, kept out of memory once they grow
+        self.results = tempfile.SpooledTemporaryFile(max_size=RESULTS_MEMORY_BYTES)
+
+    async def run(self, records: AsyncIterator[Tuple[int, Any]]):
+        """Consume the whole feed; only the current chunk is held in memory"""
+        chunk: List[Tuple[int, schemas.ProductUpsert]] = []
+        async for row, record in records:
+            try:
+                if isinstance(record, Exception):
+                    raise ValueError(f"Invalid record: {record}")
+                if not isinstance(record, dict):
+                    raise ValueError("Each record must be a JSON object")
+                chunk.append((row, schemas.ProductUpsert(**record)))
+            except (ValueError, ValidationError) as e:
+                self.counts["invalid"] += 1
+                self.results.write(result(row, "invalid", error=str(e)))
+                continue
+            if len(chunk) >= self.chunk_size:
+                await self.upsert_chunk(chunk)
+                chunk = []
+        if chunk:
+            await self.upsert_chunk(chunk)
+
+    def report(self) -> Iterator[bytes]:
+        """Per-row errors followed by a summary line"""
+        self.results.seek(0)
+        try:
+            while True:
+                block = self.results.read(64 * 1024)
+                if not block:
+                    break
+                yield block
+        finally:
+            self.results.close()
+        yield json.dumps({"summary": self.counts}).encode() + b"\n"
+
+    async def upsert_chunk(self, chunk: List[Tuple[int, schemas.ProductUpsert]]):
+        Product = models.Product
+        new_rows = [(row, product) for row, product in chunk if product.id is None]
+        changes = [(row, product) for row, product in chunk if product.id is not None]
+
+        try:
+            sharded = {}
+            if changes:
+                found = await self.db_session.execute(
+                    select(Product.id, Product.stock_shards)
+                    .where(Product.id.in_({product.id for _, product in changes}))
+                )
+                sharded = dict(found.all())
+                for row, product in changes:
+                    if product.id not in sharded:
+                        self.counts["failed"] += 1
+                        self.results.write(result(row, "failed", id=product.id, error="Product not found"))
+                changes = [(row, product) for row, product in changes if product.id in sharded]
+
+            if new_rows:
+                await self.db_session.execute(insert(Product), [
+                    {
+                        "name": product.name,
+                        "description": product.description,
+                        "price": product.price,
+                        "row_quantity": product.quantity,
+                    }
+                    for _, product in new_rows
+                ])
+
+            # Sharded stock is re-split across its shards; everything else is a plain column update
+            reshards = []
+            updates = []
+            for row, product in changes:
+                values = product.dict(exclude_none=True)
+                quantity = values.pop("quantity", None)
+                if quantity is not None:
+                    if sharded[product.id]:
+                        reshards.append((product.id, sharded[product.id], quantity))
+                    else:
+                        values["row_quantity"] = quantity
+                if len(values) > 1:
+                    updates.append(values)
+            if updates:
+                # ORM bulk UPDATE by primary key: one executemany per distinct set of columns
+                await self.db_session.execute(update(Product), updates)
+            for product_id, shards, quantity in reshards:
+                await inventory.reshard(self.db_session, product_id, shards, quantity, commit=False)
+            await self.db_session.commit()
+        except SQLAlchemyError as e:
+            await self.db_session.rollback()
+            for row, product in new_rows + changes:
+                self.counts["failed"] += 1
+                self.results.write(result(row, "failed", error=str(e.orig if hasattr(e, "orig") else e)))
+            return
+
+        self.counts["created"] += len(new_rows)
+        self.counts["updated"] += len(changes)
+        await cache.product_cache.invalidate(product.id for _, product in changes)
+
+
+def json_value(value: Any) -> Any:
+    """Encode export values the way the JSON API does"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_batch(rows: List[Any]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), default=json_value) + "\n" for row in rows
+    ).encode()
+
+
+def csv_batch(rows: List[Any]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def export_catalog(
+    format: str,
+    updated_since: Optional[datetime] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[bytes]:
+    """Every product in id order, read through one server-side cursor and encoded a batch at a time.
+
+    The export is a single SELECT, so it sees one consistent snapshot
+    however long the download takes. Uses its own session because the
+    stream outlives the request handler.
+    """
+    Product = models.Product
+    query = select(*(getattr(Product, field) for field in EXPORT_FIELDS)).order_by(Product.id)
+    if updated_since is not None:
+        query = query.where(Product.updated_at >= updated_since)
+    encode = csv_batch if format == "csv" else ndjson_batch
+    if format == "csv":
+        yield csv_batch([EXPORT_FIELDS])
+
+    async with SessionLocal() as db_session:
+        result = await db_session.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions(batch_size):
+            yield encode(rows)
@@ -0,0 +1,201 @@
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_CACHE_BACKEND = os.getenv("PRODUCT_CACHE_BACKEND", "memory")
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "5"))
+PRODUCT_CACHE_REDIS_TTL = int(os.getenv("PRODUCT_CACHE_REDIS_TTL", "60"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+INVALIDATION_CHANNEL = "product-cache:invalidate"
+
+
+class ProductCache:
+    """Two-tier read-through cache of product responses keyed by id.
+
+    Every worker keeps a bounded in-process LRU with a short TTL. With
+    PRODUCT_CACHE_BACKEND=redis a shared Redis tier sits behind it, and
+    invalidations are broadcast over Redis pub/sub so each worker drops its
+    local copy as soon as a row changes rather than when its TTL runs out.
+    Concurrent misses for the same id share a single load.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 5, redis=None, redis_ttl: int = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis = redis
+        self.redis_ttl = redis_ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._loading: Dict[int, "asyncio.Future"] = {}
+        self._epoch = 0
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "ProductCache":
+        redis = None
+        if PRODUCT_CACHE_BACKEND == "redis":
+            from redis import asyncio as aioredis
+            redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+        return cls(PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL, redis, PRODUCT_CACHE_REDIS_TTL)
+
+    async def get_or_load(
+        self,
+        product_id: int,
+        load: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Optional[Dict[str, Any]]:
+        """Cached product, or the result of load(); missing products are not cached"""
+        product = self._get_local(product_id)
+        if product is not None:
+            self.local_hits += 1
+            return product
+
+        loading = self._loading.get(product_id)
+        if loading is None:
+            # The load runs as its own task, so a caller going away does not fail the others
+            loading = asyncio.ensure_future(self._load(product_id, load, self._epoch))
+            self._loading[product_id] = loading
+            loading.add_done_callback(lambda future: self._loaded(product_id, future))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(loading)
+
+    async def _load(
+        self,
+        product_id: int,
+        load: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+        epoch: int
+    ) -> Optional[Dict[str, Any]]:
+        product = await self._get_redis(product_id)
+        if product is not None:
+            self.redis_hits += 1
+        else:
+            self.misses += 1
+            product = await load()
+            if product is None:
+                return None
+            # A row invalidated while we were loading may have been read before the change
+            if epoch == self._epoch:
+                await self._put_redis(product_id, product)
+        if epoch == self._epoch:
+            self._put_local(product_id, product)
+        return product
+
+    def _loaded(self, product_id: int, future: "asyncio.Future"):
+        if self._loading.get(product_id) is future:
+            del self._loading[product_id]
+        if not future.cancelled():
+            # Mark any error retrieved even if every caller has gone away
+            future.exception()
+
+    async def invalidate(self, product_ids: Iterable[int]):
+        """Drop products after their rows change, in this worker, in Redis and in every other worker"""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        self._epoch += 1
+        self.invalidations += len(product_ids)
+        self._drop_local(product_ids)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(*(f"product:{product_id}" for product_id in product_ids))
+                await self.redis.publish(INVALIDATION_CHANNEL, json.dumps(product_ids))
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Product cache invalidation failed: {e}")
+
+    async def listen_for_invalidations(self):
+        """Apply invalidations published by other workers; reconnects until cancelled"""
+        while self.redis is not None:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._epoch += 1
+                        self._drop_local(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Until resubscribed, local entries are bounded by their TTL
+                self.errors += 1
+                logger.error(f"Product cache invalidation listener failed: {e}")
+                await asyncio.sleep(1)
+
+    def _drop_local(self, product_ids: Iterable[int]):
+        for product_id in product_ids:
+            self._entries.pop(product_id, None)
+            # Later misses start a fresh load instead of joining one that may have read the old row
+            self._loading.pop(product_id, None)
+
+    def _get_local(self, product_id: int) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(product_id)
+        if entry is None:
+            return None
+        product, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[product_id]
+            return None
+        self._entries.move_to_end(product_id)
+        return product
+
+    def _put_local(self, product_id: int, product: Dict[str, Any]):
+        self._entries[product_id] = (product, time.monotonic() + self.ttl)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_redis(self, product_id: int) -> Optional[Dict[str, Any]]:
+        if self.redis is None:
+            return None
+        try:
+            cached = await self.redis.get(f"product:{product_id}")
+        except Exception as e:
+            # A Redis outage degrades to database reads, not errors
+            self.errors += 1
+            logger.error(f"Product cache read failed: {e}")
+            return None
+        return json.loads(cached) if cached else None
+
+    async def _put_redis(self, product_id: int, product: Dict[str, Any]):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(f"product:{product_id}", json.dumps(product, default=str), ex=self.redis_ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Product cache write failed: {e}")
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.local_hits + self.redis_hits + self.coalesced
+        lookups = hits + self.misses
+        return {
+            "backend": "redis" if self.redis is not None else "memory",
+            "entries": len(self._entries),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+product_cache = ProductCache.from_env()
@@ -0,0 +1,366 @@
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import case, delete, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from . import models, cache
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MAX_STOCK_SHARDS = int(os.getenv("PRODUCT_MAX_STOCK_SHARDS", "64"))
+
+# Holds not confirmed within this many seconds are expired and their stock returned
+HOLD_TTL = float(os.getenv("INVENTORY_HOLD_TTL", "900"))
+HOLD_SWEEP_INTERVAL = float(os.getenv("INVENTORY_HOLD_SWEEP_INTERVAL", "5"))
+HOLD_SWEEP_BATCH = int(os.getenv("INVENTORY_HOLD_SWEEP_BATCH", "500"))
+
+# Kept in step with infra/init-db/product.sql, for databases created before sharding
+STOCK_SHARDS_DDL = [
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS stock_shards INTEGER NOT NULL DEFAULT 0",
+]
+
+
+async def add_stock_shards_column(conn: AsyncConnection):
+    """Add products.stock_shards to an existing PostgreSQL table"""
+    if conn.dialect.name != "postgresql":
+        return
+    for statement in STOCK_SHARDS_DDL:
+        await conn.execute(text(statement))
+
+
+def quantities_by_product(items: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """Requested quantity per product id, duplicates merged, in product id order"""
+    totals: Dict[int, int] = {}
+    for product_id, quantity in items:
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    return dict(sorted(totals.items()))
+
+
+async def lock_products(db_session: AsyncSession, product_ids: Iterable[int]) -> Set[int]:
+    """Row-lock unsharded products in id order and return their ids.
+
+    The fixed order means concurrent orders never wait on each other in a
+    cycle. Sharded products are left unlocked: their stock lives in shard
+    rows, which are locked one at a time, after every product row.
+    """
+    return set(await db_session.scalars(
+        select(models.Product.id)
+        .where(models.Product.id.in_(list(product_ids)), models.Product.stock_shards == 0)
+        .order_by(models.Product.id)
+        .with_for_update()
+    ))
+
+
+async def reserve_items(
+    db_session: AsyncSession,
+    items: Iterable[Tuple[int, int]],
+    order_id: Optional[int] = None
+) -> Tuple[bool, str]:
+    """Take stock for every item or for none of them.
+
+    One conditional UPDATE decrements all unsharded rows that still have
+    enough stock, and each sharded product is decremented on one of its
+    shards; if any product is missing or short the transaction is rolled
+    back. With an order id the stock is recorded as holds that expire
+    after HOLD_TTL unless confirmed, and a repeated reservation for the
+    same order is a no-op. Commits and invalidates the cached products on
+    success.
+    """
+    quantities = quantities_by_product(items)
+    if not quantities:
+        return True, ""
+    if order_id is not None and await has_holds(db_session, order_id):
+        # Redelivered order.created event or a retried request
+        return True, ""
+    locked = await lock_products(db_session, quantities)
+    unsharded = {product_id: quantity for product_id, quantity in quantities.items() if product_id in locked}
+
+    reserved = True
+    if unsharded:
+        Product = models.Product
+        requested = case(unsharded, value=Product.id)
+        rows = await db_session.scalars(
+            update(Product)
+            .where(Product.id.in_(list(unsharded)), Product.row_quantity >= requested)
+            .values(row_quantity=Product.row_quantity - requested)
+            .returning(Product.id)
+            .execution_options(synchronize_session=False)
+        )
+        reserved = len(rows.all()) == len(unsharded)
+
+    for product_id, quantity in quantities.items():
+        if not reserved:
+            break
+        if product_id not in unsharded:
+            reserved = await reserve_from_shards(db_session, product_id, quantity)
+
+    if reserved:
+        if order_id is not None:
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=HOLD_TTL)
+            await db_session.execute(insert(models.InventoryHold), [
+                {"order_id": order_id, "product_id": product_id, "quantity": quantity,
+                 "status": "held", "expires_at": expires_at}
+                for product_id, quantity in quantities.items()
+            ])
+        await db_session.commit()
+        await cache.product_cache.invalidate(quantities)
+        return True, ""
+
+    await db_session.rollback()
+    return False, await shortage_reason(db_session, quantities)
+
+
+async def reserve_from_shards(db_session: AsyncSession, product_id: int, quantity: int) -> bool:
+    """Decrement one of a sharded product's counters, or several if no single one has enough"""
+    Shard = models.ProductStockShard
+    # A random shard with enough stock that no other transaction holds right now
+    candidate = (
+        select(Shard.shard)
+        .where(Shard.product_id == product_id, Shard.quantity >= quantity)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    taken = await db_session.scalar(
+        update(Shard)
+        .where(Shard.product_id == product_id, Shard.shard == candidate, Shard.quantity >= quantity)
+        .values(quantity=Shard.quantity - quantity)
+        .returning(Shard.shard)
+        .execution_options(synchronize_session=False)
+    )
+    if taken is not None:
+        return True
+
+    # Every shard is busy or too small on its own: lock them all (in shard order) and combine
+    shards = (await db_session.execute(
+        select(Shard.shard, Shard.quantity)
+        .where(Shard.product_id == product_id)
+        .order_by(Shard.shard)
+        .with_for_update()
+    )).all()
+    if sum(available for _, available in shards) < quantity:
+        return False
+    taken_per_shard = {}
+    remaining = quantity
+    for shard, available in sorted(shards, key=lambda row: row[1], reverse=True):
+        take = min(available, remaining)
+        if take > 0:
+            taken_per_shard[shard] = take
+            remaining -= take
+    await db_session.execute(
+        update(Shard)
+        .where(Shard.product_id == product_id, Shard.shard.in_(list(taken_per_shard)))
+        .values(quantity=Shard.quantity - case(taken_per_shard, value=Shard.shard))
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+async def shortage_reason(db_session: AsyncSession, quantities: Dict[int, int]) -> str:
+    """Why a reservation failed, naming the first product (by id) that caused it"""
+    stock = dict((await db_session.execute(
+        select(models.Product.id, models.Product.quantity).where(models.Product.id.in_(list(quantities)))
+    )).all())
+    for product_id, quantity in quantities.items():
+        available: Optional[int] = stock.get(product_id)
+        if available is None:
+            return f"Product {product_id} not found"
+        if available < quantity:
+            return f"Insufficient inventory for product {product_id}"
+    # Stock was restored between the update and this read
+    return "Inventory changed during reservation, retry"
+
+
+async def has_holds(db_session: AsyncSession, order_id: int) -> bool:
+    """Whether any hold, in any state, was ever recorded for the order"""
+    Hold = models.InventoryHold
+    return await db_session.scalar(select(Hold.id).where(Hold.order_id == order_id).limit(1)) is not None
+
+
+async def confirm_order(db_session: AsyncSession, order_id: int) -> int:
+    """Make an order's live holds permanent; returns how many were confirmed. Commits."""
+    Hold = models.InventoryHold
+    result = await db_session.execute(
+        update(Hold)
+        .where(Hold.order_id == order_id, Hold.status == "held")
+        .values(status="confirmed")
+        .execution_options(synchronize_session=False)
+    )
+    await db_session.commit()
+    return result.rowcount
+
+
+async def release_order(db_session: AsyncSession, order_id: int) -> Optional[int]:
+    """Return the stock of an order's held or confirmed holds.
+
+    A single UPDATE claims the holds, so a hold can never be released twice
+    or both released and expired. Returns how many were released, or None
+    if the order never had holds. Commits and invalidates the cache.
+    """
+    Hold = models.InventoryHold
+    released = (await db_session.execute(
+        update(Hold)
+        .where(Hold.order_id == order_id, Hold.status.in_(["held", "confirmed"]))
+        .values(status="released")
+        .returning(Hold.product_id, Hold.quantity)
+        .execution_options(synchronize_session=False)
+    )).all()
+    if not released:
+        await db_session.rollback()
+        return 0 if await has_holds(db_session, order_id) else None
+    quantities = quantities_by_product(released)
+    await restock(db_session, quantities)
+    await db_session.commit()
+    await cache.product_cache.invalidate(quantities)
+    return len(released)
+
+
+async def expire_holds(db_session: AsyncSession, batch_size: int) -> int:
+    """Expire up to batch_size overdue holds and return their stock, in one transaction.
+
+    Holds locked by another sweeper or by a confirm/release in progress are
+    skipped, so several workers can sweep at once. Commits.
+    """
+    Hold = models.InventoryHold
+    overdue = (
+        select(Hold.id)
+        .where(Hold.status == "held", Hold.expires_at <= datetime.now(timezone.utc))
+        .order_by(Hold.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    expired: List[Tuple[int, int]] = (await db_session.execute(
+        update(Hold)
+        .where(Hold.id.in_(overdue), Hold.status == "held")
+        .values(status="expired")
+        .returning(Hold.product_id, Hold.quantity)
+        .execution_options(synchronize_session=False)
+    )).all()
+    if not expired:
+        await db_session.rollback()
+        return 0
+    quantities = quantities_by_product(expired)
+    await restock(db_session, quantities)
+    await db_session.commit()
+    await cache.product_cache.invalidate(quantities)
+    return len(expired)
+
+
+async def run_hold_sweeper():
+    """Expire overdue holds every HOLD_SWEEP_INTERVAL seconds, a batch per transaction"""
+    while True:
+        try:
+            expired = HOLD_SWEEP_BATCH
+            while expired == HOLD_SWEEP_BATCH:
+                async with SessionLocal() as db_session:
+                    expired = await expire_holds(db_session, HOLD_SWEEP_BATCH)
+                if expired:
+                    logger.info(f"Expired {expired} inventory holds")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Inventory hold sweep failed: {e}")
+        await asyncio.sleep(HOLD_SWEEP_INTERVAL)
+
+
+async def release_items(db_session: AsyncSession, items: Iterable[Tuple[int, int]]):
+    """Return stock for every item; unknown products are skipped. Commits and invalidates the cache."""
+    quantities = quantities_by_product(items)
+    if not quantities:
+        return
+    await restock(db_session, quantities)
+    await db_session.commit()
+    await cache.product_cache.invalidate(quantities)
+
+
+async def restock(db_session: AsyncSession, quantities: Dict[int, int]):
+    """Add quantities (in product id order) back to products and shards, without committing"""
+    locked = await lock_products(db_session, quantities)
+    unsharded = {product_id: quantity for product_id, quantity in quantities.items() if product_id in locked}
+
+    if unsharded:
+        Product = models.Product
+        await db_session.execute(
+            update(Product)
+            .where(Product.id.in_(list(unsharded)))
+            .values(row_quantity=Product.row_quantity + case(unsharded, value=Product.id))
+            .execution_options(synchronize_session=False)
+        )
+    for product_id, quantity in quantities.items():
+        if product_id not in unsharded:
+            await release_to_shards(db_session, product_id, quantity)
+
+
+async def release_to_shards(db_session: AsyncSession, product_id: int, quantity: int):
+    """Add stock back to a random free shard, or the first shard if all are busy"""
+    Shard = models.ProductStockShard
+    free = (
+        select(Shard.shard)
+        .where(Shard.product_id == product_id)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    first = select(func.min(Shard.shard)).where(Shard.product_id == product_id).scalar_subquery()
+    for shard in (free, first):
+        returned = await db_session.scalar(
+            update(Shard)
+            .where(Shard.product_id == product_id, Shard.shard == shard)
+            .values(quantity=Shard.quantity + quantity)
+            .returning(Shard.shard)
+            .execution_options(synchronize_session=False)
+        )
+        if returned is not None:
+            return
+
+
+async def reshard(
+    db_session: AsyncSession,
+    product_id: int,
+    shards: int,
+    total: Optional[int] = None,
+    commit: bool = True
+) -> bool:
+    """Spread a product's stock evenly over `shards` counters; 0 or 1 moves it back onto the product row.
+
+    Keeps the current total unless a new one is given. Returns False if
+    there is no such product. Commits and invalidates the cache, unless
+    commit is False and the caller does both as part of a larger change.
+    """
+    Product = models.Product
+    Shard = models.ProductStockShard
+    row_quantity = await db_session.scalar(
+        select(Product.row_quantity).where(Product.id == product_id).with_for_update()
+    )
+    if row_quantity is None:
+        return False
+    held = (await db_session.scalars(
+        select(Shard.quantity).where(Shard.product_id == product_id).order_by(Shard.shard).with_for_update()
+    )).all()
+    if total is None:
+        total = row_quantity + sum(held)
+
+    await db_session.execute(delete(Shard).where(Shard.product_id == product_id))
+    if shards > 1:
+        per_shard, extra = divmod(total, shards)
+        await db_session.execute(insert(Shard), [
+            {"product_id": product_id, "shard": shard, "quantity": per_shard + (1 if shard < extra else 0)}
+            for shard in range(shards)
+        ])
+        values = {"row_quantity": 0, "stock_shards": shards}
+    else:
+        values = {"row_quantity": total, "stock_shards": 0}
+    await db_session.execute(
+        update(Product).where(Product.id == product_id).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        await db_session.commit()
+        await cache.product_cache.invalidate([product_id])
+    return True
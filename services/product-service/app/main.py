@@ -7,16 +7,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from aio_pika import connect_robust, Message
 from aio_pika.abc import AbstractIncomingMessage
-from . import models, routes
-from .db import engine
+from . import cache, inventory, models, routes, search
+from .db import engine, pool_status, SessionLocal
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-
-models.Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Product Service",
     description="Product management and inventory control",
@@ -30,6 +27,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset paging cursor for GET /products/
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -48,6 +47,18 @@ async def health_check():
     return {"status": "ok", "service": "product-service"}
 
 
+@app.get("/cache")
+async def cache_stats():
+    """Product cache hit ratio"""
+    return cache.product_cache.stats()
+
+
+@app.get("/db/pool")
+async def db_pool():
+    """Database connection pool occupancy and checkout wait times"""
+    return pool_status()
+
+
 
 async def consume_order_events():
     
@@ -59,6 +70,8 @@ async def consume_order_events():
         exchange = await channel.declare_exchange("order_events", "topic", durable=True)
         queue = await channel.declare_queue("product_service_queue", durable=True)
         await queue.bind(exchange, "order.created")
+        await queue.bind(exchange, "order.confirmed")
+        await queue.bind(exchange, "order.cancelled")
         
         async def process_message(message: AbstractIncomingMessage):
             async with message.process():
@@ -71,41 +84,27 @@ async def consume_order_events():
                         order_id = data.get("order_id")
                         items = data.get("items", [])
                         
-                      
-                        from .db import SessionLocal
-                        from .models import Product
                         
-                        db = SessionLocal()
-                        try:
-                            
-                            success = True
-                            reason = ""
-                            
-                            for item in items:
-                                product = db.query(Product).filter(Product.id == item["product_id"]).first()
-                                if not product:
-                                    success = False
-                                    reason = f"Product {item['product_id']} not found"
-                                    break
-                                if product.quantity < item["quantity"]:
-                                    success = False
-                                    reason = f"Insufficient inventory for product {item['product_id']}"
-                                    break
-                            
-                            if success:
-                             
-                                for item in items:
-                                    product = db.query(Product).filter(Product.id == item["product_id"]).first()
-                                    product.quantity -= item["quantity"]
-                                db.commit()
-                                await publish_event("inventory.reserved", {"order_id": order_id})
-                            else:
-                                await publish_event("inventory.failed", {"order_id": order_id, "reason": reason})
-                        except Exception as e:
-                            db.rollback()
-                            await publish_event("inventory.failed", {"order_id": order_id, "reason": str(e)})
-                        finally:
-                            db.close()
+                        async with SessionLocal() as db:
+                            try:
+                                success, reason = await inventory.reserve_items(
+                                    db, ((item["product_id"], item["quantity"]) for item in items), order_id
+                                )
+                                if success:
+                                    await publish_event("inventory.reserved", {"order_id": order_id})
+                                else:
+                                    await publish_event("inventory.failed", {"order_id": order_id, "reason": reason})
+                            except Exception as e:
+                                await db.rollback()
+                                await publish_event("inventory.failed", {"order_id": order_id, "reason": str(e)})
+                    
+                    elif message.routing_key == "order.confirmed":
+                        async with SessionLocal() as db:
+                            await inventory.confirm_order(db, data["order_id"])
+                    
+                    elif message.routing_key == "order.cancelled":
+                        async with SessionLocal() as db:
+                            await inventory.release_order(db, data["order_id"])
                     
                 except Exception as e:
                     logger.error(f"Error processing message: {e}")
@@ -141,5 +140,19 @@ async def publish_event(event_type: str, data: dict):
 
 @app.on_event("startup")
 async def startup_event():
-    """Start RabbitMQ consumer on startup"""
+    """Create database tables and start the RabbitMQ consumer, hold sweeper and cache invalidation listener"""
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await search.create_search_index(conn)
+        await inventory.add_stock_shards_column(conn)
     asyncio.create_task(consume_order_events())
+    asyncio.create_task(inventory.run_hold_sweeper())
+    if cache.product_cache.redis is not None:
+        asyncio.create_task(cache.product_cache.listen_for_invalidations())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the product cache and database pool"""
+    await cache.product_cache.close()
+    await engine.dispose()
@@ -1,12 +1,22 @@
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, DECIMAL
+from sqlalchemy import Column, Integer, String, DateTime, Text, DECIMAL, Index, ForeignKey, select, text
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import column_property
 from sqlalchemy.sql import func
 from datetime import datetime
 
 Base = declarative_base()
 
 
+class ProductStockShard(Base):
+    """One of the sub-counters holding the stock of a sharded (hot) product"""
+    __tablename__ = "product_stock_shards"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -14,6 +24,50 @@ class Product(Base):
     name = Column(String(255), nullable=False, index=True)
     description = Column(Text)
     price = Column(DECIMAL(10, 2), nullable=False, index=True)
-    quantity = Column(Integer, nullable=False, default=0)
+    # Stock kept on the product row itself; zero once the product is sharded
+    row_quantity = Column("quantity", Integer, nullable=False, default=0)
+    # Number of ProductStockShard rows holding the stock, 0 when unsharded
+    stock_shards = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Total stock: the row counter plus any shards
+    quantity = column_property(
+        row_quantity + func.coalesce(
+            select(func.sum(ProductStockShard.quantity))
+            .where(ProductStockShard.product_id == id)
+            .scalar_subquery(),
+            0
+        )
+    )
+
+    # Keyset pagination: (price, id) ordering and name-prefix filtering walk these indexes
+    __table_args__ = (
+        Index("idx_products_price_id", "price", "id"),
+        Index("idx_products_name_pattern", "name", "id", postgresql_ops={"name": "text_pattern_ops"}),
+        # Incremental catalog exports (updated_since)
+        Index("idx_products_updated_at", "updated_at"),
+    )
+
+
+class InventoryHold(Base):
+    """Stock taken for an order: held until confirmed, released, or expired by the sweeper"""
+    __tablename__ = "inventory_holds"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    # held -> confirmed | released | expired
+    status = Column(String(20), nullable=False, default="held")
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # The sweeper only ever scans live holds, oldest expiry first
+    __table_args__ = (
+        Index(
+            "idx_inventory_holds_expiry", "expires_at",
+            postgresql_where=text("status = 'held'"),
+            sqlite_where=text("status = 'held'"),
+        ),
+    )
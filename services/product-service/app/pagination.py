@@ -0,0 +1,82 @@
+
+import json
+import base64
+import binascii
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import Select, select, tuple_
+from . import models
+
+# Orderings with a matching index: the primary key, and idx_products_price_id
+SORT_KEYS = ("id", "price")
+
+
+def encode_cursor(sort: str, product: models.Product) -> str:
+    """Opaque cursor pointing just past the given product"""
+    position = {"s": sort, "i": product.id}
+    if sort == "price":
+        position["p"] = str(product.price)
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[int, Optional[Decimal]]:
+    """(id, price) of the last product on the previous page"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if position["s"] != sort:
+            raise ValueError("cursor was issued for another sort order")
+        price = Decimal(position["p"]) if sort == "price" else None
+        return int(position["i"]), price
+    except (ValueError, KeyError, TypeError, InvalidOperation, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def like_prefix(prefix: str) -> str:
+    """LIKE pattern, escaped with "/", matching names that start with prefix"""
+    escaped = prefix.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return escaped + "%"
+
+
+def product_page_query(
+    sort: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    min_price: Optional[Decimal] = None,
+    max_price: Optional[Decimal] = None,
+    name_prefix: Optional[str] = None,
+) -> Select:
+    """Keyset page query; fetches one row past limit to tell whether another page exists"""
+    Product = models.Product
+    query = select(Product)
+    if min_price is not None:
+        query = query.where(Product.price >= min_price)
+    if max_price is not None:
+        query = query.where(Product.price <= max_price)
+    if name_prefix:
+        query = query.where(Product.name.like(like_prefix(name_prefix), escape="/"))
+
+    if cursor:
+        last_id, last_price = decode_cursor(cursor, sort)
+        if sort == "price":
+            query = query.where(tuple_(Product.price, Product.id) > tuple_(last_price, last_id))
+        else:
+            query = query.where(Product.id > last_id)
+
+    if sort == "price":
+        query = query.order_by(Product.price, Product.id)
+    else:
+        query = query.order_by(Product.id)
+    return query.limit(limit + 1)
+
+
+def split_page(rows: Any, sort: str, limit: int) -> Tuple[list, Optional[str]]:
+    """The page's rows and the cursor for the next page, if any"""
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort, rows[-1])
@@ -1,38 +1,167 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from . import models, schemas, db
+import os
+from datetime import datetime
+from decimal import Decimal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from . import models, schemas, db, bulk, cache, inventory, pagination, search
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = int(os.getenv("PRODUCT_MAX_PAGE_SIZE", "1000"))
+MAX_BATCH_IDS = int(os.getenv("PRODUCT_MAX_BATCH_IDS", "500"))
+PRODUCT_FIELDS = list(schemas.ProductResponse.__fields__)
+
+
+def parse_csv(value: str) -> List[str]:
+    """Non-empty items of a comma-separated query parameter"""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
 
 @router.post("/", response_model=schemas.ProductResponse)
-async def create_product(product: schemas.ProductCreate, db_session: Session = Depends(db.get_db)):
+async def create_product(product: schemas.ProductCreate, db_session: AsyncSession = Depends(db.get_db)):
     """Create a new product"""
     db_product = models.Product(
         name=product.name,
         description=product.description,
         price=product.price,
-        quantity=product.quantity
+        row_quantity=product.quantity
     )
     db_session.add(db_product)
-    db_session.commit()
-    db_session.refresh(db_product)
+    await db_session.commit()
+    await db_session.refresh(db_product)
     return db_product
 
 
+@router.post("/bulk")
+async def bulk_upsert_products(request: Request, db_session: AsyncSession = Depends(db.get_db)):
+    """Create or update products from an NDJSON or CSV feed, returning per-row errors and a summary"""
+    content_type = request.headers.get("content-type", "")
+    lines = bulk.body_lines(request.stream())
+    if "csv" in content_type:
+        records = bulk.csv_records(lines)
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        records = bulk.ndjson_records(lines)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send application/x-ndjson or text/csv"
+        )
+    
+    # The whole feed is consumed before responding: the streaming response
+    # listens for disconnects on the same receive channel and would swallow body chunks
+    upserter = bulk.ProductUpserter(db_session)
+    await upserter.run(records)
+    return StreamingResponse(upserter.report(), media_type="application/x-ndjson")
+
+
+@router.get("/export")
+async def export_products(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    updated_since: Optional[datetime] = None
+):
+    """Stream the whole catalog, or the products changed since a time, as NDJSON or CSV"""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        bulk.export_catalog(format, updated_since),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=products.{format}"}
+    )
+
+
 @router.get("/", response_model=List[schemas.ProductResponse])
-async def list_products(skip: int = 0, limit: int = 100, db_session: Session = Depends(db.get_db)):
-    """List all products"""
-    products = db_session.query(models.Product).offset(skip).limit(limit).all()
+async def list_products(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = Query("id", regex="^(id|price)$"),
+    min_price: Optional[Decimal] = None,
+    max_price: Optional[Decimal] = None,
+    name_prefix: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    db_session: AsyncSession = Depends(db.get_db)
+):
+    """List products a page at a time; pass the X-Next-Cursor header back as cursor for the next page"""
+    query = pagination.product_page_query(sort, limit, cursor, min_price, max_price, name_prefix)
+    if skip and not cursor:
+        # Offset paging still works but scans every skipped row
+        query = query.offset(skip)
+    products, next_cursor = pagination.split_page(await db_session.scalars(query), sort, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return products
 
 
+@router.get("/search", response_model=List[schemas.ProductResponse])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0, le=1000),
+    db_session: AsyncSession = Depends(db.get_db)
+):
+    """Products whose name or description contain words starting with each query word, best match first"""
+    terms = search.search_terms(q)
+    if not terms:
+        return []
+    query = search.product_search_query(db_session.bind.dialect.name, terms, limit, skip)
+    return (await db_session.scalars(query)).all()
+
+
+@router.get("/batch", response_model=schemas.ProductBatchResponse)
+async def get_products_batch(
+    ids: str = Query(..., description="Comma-separated product ids"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; id is always included"),
+    db_session: AsyncSession = Depends(db.get_db)
+):
+    """Fetch many products with one query; ids that do not exist are listed in missing"""
+    try:
+        product_ids = list(dict.fromkeys(int(item) for item in parse_csv(ids)))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be comma-separated integers"
+        )
+    if not product_ids or len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Between 1 and {MAX_BATCH_IDS} ids are required"
+        )
+
+    selected = PRODUCT_FIELDS
+    if fields:
+        requested = parse_csv(fields)
+        unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+        selected = ["id"] + [field for field in dict.fromkeys(requested) if field != "id"]
+
+    columns = [getattr(models.Product, field) for field in selected]
+    rows = await db_session.execute(select(*columns).where(models.Product.id.in_(product_ids)))
+    found = {row.id: dict(row._mapping) for row in rows}
+    return {
+        "products": [found[product_id] for product_id in product_ids if product_id in found],
+        "missing": [product_id for product_id in product_ids if product_id not in found],
+    }
+
+
+async def load_product(product_id: int) -> Optional[dict]:
+    """Product response fields from the database, or None if there is no such product"""
+    # Uses its own session: the load may outlive the request that started it
+    async with db.SessionLocal() as db_session:
+        product = await db_session.get(models.Product, product_id)
+        return schemas.ProductResponse.from_orm(product).dict() if product else None
+
+
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
-async def get_product(product_id: int, db_session: Session = Depends(db.get_db)):
-    """Get product by ID"""
-    product = db_session.query(models.Product).filter(models.Product.id == product_id).first()
+async def get_product(product_id: int):
+    """Get product by ID, read through the product cache"""
+    product = await cache.product_cache.get_or_load(product_id, lambda: load_product(product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -45,10 +174,10 @@ async def get_product(product_id: int, db_session: Session = Depends(db.get_db))
 async def update_product(
     product_id: int, 
     product_update: schemas.ProductUpdate, 
-    db_session: Session = Depends(db.get_db)
+    db_session: AsyncSession = Depends(db.get_db)
 ):
     """Update product"""
-    product = db_session.query(models.Product).filter(models.Product.id == product_id).first()
+    product = await db_session.get(models.Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -56,62 +185,95 @@ async def update_product(
         )
     
     update_data = product_update.dict(exclude_unset=True)
+    quantity = update_data.pop("quantity", None)
     for field, value in update_data.items():
         setattr(product, field, value)
+    if quantity is not None and not product.stock_shards:
+        product.row_quantity = quantity
+    elif quantity is not None:
+        # Re-split the new total across the existing shards, in the same transaction as the other fields
+        await inventory.reshard(db_session, product_id, product.stock_shards, quantity, commit=False)
     
-    db_session.commit()
-    db_session.refresh(product)
+    await db_session.commit()
+    await db_session.refresh(product)
+    await cache.product_cache.invalidate([product_id])
     return product
 
 
+@router.put("/{product_id}/stock-shards", response_model=schemas.ProductResponse)
+async def update_stock_shards(
+    product_id: int,
+    stock_shards: schemas.StockShardsUpdate,
+    db_session: AsyncSession = Depends(db.get_db)
+):
+    """Split a hot product's stock over several counter rows, or merge it back with shards=0"""
+    if stock_shards.shards > inventory.MAX_STOCK_SHARDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {inventory.MAX_STOCK_SHARDS} shards are supported"
+        )
+    if not await inventory.reshard(db_session, product_id, stock_shards.shards):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    return await db_session.get(models.Product, product_id, populate_existing=True)
+
+
 @router.post("/reserve-inventory")
 async def reserve_inventory(
     reservation: schemas.InventoryReservationRequest,
-    db_session: Session = Depends(db.get_db)
+    db_session: AsyncSession = Depends(db.get_db)
 ):
     """Reserve inventory for an order"""
     try:
-        
-        for item in reservation.items:
-            product = db_session.query(models.Product).filter(models.Product.id == item.product_id).first()
-            if not product:
-                return {"success": False, "reason": f"Product {item.product_id} not found"}
-            if product.quantity < item.quantity:
-                return {"success": False, "reason": f"Insufficient inventory for product {item.product_id}"}
-        
-       
-        for item in reservation.items:
-            product = db_session.query(models.Product).filter(models.Product.id == item.product_id).first()
-            product.quantity -= item.quantity
-        
-        db_session.commit()
+        success, reason = await inventory.reserve_items(
+            db_session,
+            ((item.product_id, item.quantity) for item in reservation.items),
+            reservation.order_id
+        )
+        if not success:
+            return {"success": False, "reason": reason}
         return {"success": True, "order_id": reservation.order_id}
     
     except Exception as e:
-        db_session.rollback()
+        await db_session.rollback()
         return {"success": False, "reason": str(e)}
 
 
 @router.post("/release-inventory")
 async def release_inventory(
     reservation: schemas.InventoryReservationRequest,
-    db_session: Session = Depends(db.get_db)
+    db_session: AsyncSession = Depends(db.get_db)
 ):
     """Release reserved inventory"""
     try:
-        for item in reservation.items:
-            product = db_session.query(models.Product).filter(models.Product.id == item.product_id).first()
-            if product:
-                product.quantity += item.quantity
-        
-        db_session.commit()
+        released = await inventory.release_order(db_session, reservation.order_id)
+        if released is None:
+            # Reserved before holds were recorded: trust the item list
+            await inventory.release_items(
+                db_session, ((item.product_id, item.quantity) for item in reservation.items)
+            )
         return {"success": True, "order_id": reservation.order_id}
     
     except Exception as e:
-        db_session.rollback()
+        await db_session.rollback()
         return {"success": False, "reason": str(e)}
 
 
+@router.post("/holds/{order_id}/confirm")
+async def confirm_holds(order_id: int, db_session: AsyncSession = Depends(db.get_db)):
+    """Make an order's inventory holds permanent so the sweeper no longer expires them"""
+    return {"order_id": order_id, "confirmed": await inventory.confirm_order(db_session, order_id)}
+
+
+@router.post("/holds/{order_id}/release")
+async def release_holds(order_id: int, db_session: AsyncSession = Depends(db.get_db)):
+    """Return the stock held or confirmed for an order"""
+    released = await inventory.release_order(db_session, order_id)
+    return {"order_id": order_id, "released": released or 0}
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
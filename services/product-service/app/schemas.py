@@ -1,6 +1,6 @@
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, root_validator, validator
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from decimal import Decimal
 
@@ -19,17 +19,49 @@ class ProductUpdate(BaseModel):
     quantity: Optional[int] = None
 
 
+class ProductUpsert(BaseModel):
+    """One row of a bulk catalog feed: updates product id if given, otherwise creates a product"""
+    id: Optional[int] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[Decimal] = Field(None, ge=0)
+    quantity: Optional[int] = Field(None, ge=0)
+
+    @validator("*", pre=True)
+    def blank_is_missing(cls, value):
+        # CSV feeds have empty cells rather than missing keys
+        return None if value == "" else value
+
+    @root_validator(skip_on_failure=True)
+    def new_products_are_complete(cls, values):
+        if values.get("id") is None:
+            missing = [field for field in ("name", "price", "quantity") if values.get(field) is None]
+            if missing:
+                raise ValueError(f"new products need {', '.join(missing)}")
+        return values
+
+
+class StockShardsUpdate(BaseModel):
+    shards: int = Field(..., ge=0)
+
+
 class ProductResponse(BaseModel):
     id: int
     name: str
     description: Optional[str]
     price: Decimal
     quantity: int
+    stock_shards: int = 0
     created_at: datetime
     updated_at: datetime
 
     class Config:
-        from_attributes = True
+        orm_mode = True
+
+
+class ProductBatchResponse(BaseModel):
+    products: List[Dict[str, Any]]
+    missing: List[int]
 
 
 class InventoryReservation(BaseModel):
@@ -0,0 +1,77 @@
+
+import os
+import re
+from typing import List
+from sqlalchemy import Select, column, func, literal_column, or_, select, table, text, union
+from sqlalchemy.ext.asyncio import AsyncConnection
+from . import models
+
+# 'simple' keeps words unstemmed, so typeahead prefixes match what users typed
+SEARCH_CONFIG = "simple"
+# Broad prefixes ("a") can match much of the catalog; only this many name matches
+# and this many other matches are ranked
+SEARCH_MAX_CANDIDATES = int(os.getenv("PRODUCT_SEARCH_MAX_CANDIDATES", "2000"))
+SEARCH_MAX_TERMS = 8
+
+# Kept in step with infra/init-db/product.sql. PostgreSQL maintains the
+# generated column on every insert and update, so the GIN index is updated
+# incrementally by whichever code path writes the row.
+SEARCH_DDL = [
+    f"""ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS idx_products_search ON products USING GIN (search_vector)",
+]
+
+# Not mapped on models.Product so listing queries never fetch the vector
+search_vector = column("search_vector")
+products_search = table("products", column("id"), search_vector)
+
+
+def search_terms(q: str) -> List[str]:
+    """Lower-cased words of a query, without tsquery operators"""
+    return re.findall(r"\w+", q.lower())[:SEARCH_MAX_TERMS]
+
+
+def prefix_tsquery(terms: List[str], weights: str = "") -> str:
+    """tsquery text matching documents containing every term as a word prefix, optionally only in weights"""
+    return " & ".join(f"{term}:*{weights}" for term in terms)
+
+
+async def create_search_index(conn: AsyncConnection):
+    """Add the search column and its GIN index when running on PostgreSQL"""
+    if conn.dialect.name != "postgresql":
+        return
+    for statement in SEARCH_DDL:
+        await conn.execute(text(statement))
+
+
+def product_search_query(dialect: str, terms: List[str], limit: int, skip: int) -> Select:
+    """Products matching all terms, best match first"""
+    Product = models.Product
+    if dialect != "postgresql":
+        # Unranked fallback for local SQLite databases
+        query = select(Product)
+        for term in terms:
+            query = query.where(or_(Product.name.ilike(f"%{term}%"), Product.description.ilike(f"%{term}%")))
+        return query.order_by(Product.id).offset(skip).limit(limit)
+
+    config = literal_column(f"'{SEARCH_CONFIG}'")
+    tsquery = func.to_tsquery(config, prefix_tsquery(terms))
+    # Name hits (weight A) outrank description-only ones, so they get their own
+    # candidate slots rather than competing with an arbitrary sample of all matches
+    name_tsquery = func.to_tsquery(config, prefix_tsquery(terms, "A"))
+    ranked = select(products_search.c.id, func.ts_rank_cd(search_vector, tsquery).label("rank"))
+    candidates = union(
+        ranked.where(search_vector.bool_op("@@")(name_tsquery)).limit(SEARCH_MAX_CANDIDATES),
+        ranked.where(search_vector.bool_op("@@")(tsquery)).limit(SEARCH_MAX_CANDIDATES),
+    ).subquery()
+    return (
+        select(Product)
+        .join(candidates, candidates.c.id == Product.id)
+        .order_by(candidates.c.rank.desc(), Product.id)
+        .offset(skip)
+        .limit(limit)
+    )
@@ -1,10 +1,17 @@
 
 import os
+import hmac
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status
+from fastapi import Header, HTTPException, status
 from .schemas import TokenData
 
 
@@ -12,7 +19,21 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Shared secret for bulk user import; the endpoint is disabled while unset
+IMPORT_TOKEN = os.getenv("USER_IMPORT_TOKEN", "")
+
+# bcrypt cost factor; existing hashes with another cost are rehashed on next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def require_import_token(x_import_token: Optional[str] = Header(None)):
+    """Allow bulk import only for callers holding USER_IMPORT_TOKEN"""
+    if not IMPORT_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User import is disabled")
+    if x_import_token is None or not hmac.compare_digest(x_import_token.encode(), IMPORT_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid import token")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -25,6 +46,93 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """Runs bcrypt in a bounded thread pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL, so worker threads use every core. Once
+    max_pending calls are queued or running, new ones are rejected with a
+    503 straight away instead of queueing behind a login burst.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many authentication requests, retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        return await self._submit(fn, *args)
+
+    async def run_batch(self, fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """Run fn over items on every worker, without admission control.
+
+        Only one window of `workers` jobs is queued at a time, so logins
+        arriving during a bulk job wait behind at most one window.
+        """
+        results = []
+        for start in range(0, len(items), self.workers):
+            window = items[start:start + self.workers]
+            with self._lock:
+                self.pending += len(window)
+            results.extend(await asyncio.gather(*(self._submit(fn, item) for item in window)))
+        return results
+
+    def _submit(self, fn: Callable[..., Any], *args) -> "asyncio.Future":
+        future = self.executor.submit(fn, *args)
+        # Counted until the thread finishes, even if the caller has gone away
+        future.add_done_callback(self._finished)
+        return asyncio.wrap_future(future)
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "rounds": BCRYPT_ROUNDS,
+        }
+
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+password_hasher = PasswordHasher(
+    HASH_WORKERS,
+    int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the bcrypt pool"""
+    return await password_hasher.run(pwd_context.hash, password)
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash many passwords in parallel on the bcrypt pool"""
+    return await password_hasher.run_batch(pwd_context.hash, passwords)
+
+
+async def check_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the bcrypt pool; also returns a new hash if the stored one uses an old cost"""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -38,6 +146,42 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+class TokenCache:
+    """Bounded LRU of decoded tokens, keyed by token digest and kept until exp"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[TokenData, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes) -> Optional[TokenData]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        token_data, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return token_data
+
+    def put(self, digest: bytes, token_data: TokenData, expires_at: float):
+        self._entries[digest] = (token_data, expires_at)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
+
+
 def verify_token(token: str) -> TokenData:
     """Verify JWT token and return token data"""
     credentials_exception = HTTPException(
@@ -46,13 +190,31 @@ def verify_token(token: str) -> TokenData:
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    digest = hashlib.sha256(token.encode()).digest()
+    token_data = token_cache.get(digest)
+    if token_data is not None:
+        return token_data
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("exp") is None:
             raise credentials_exception
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
     
+    token_cache.put(digest, token_data, payload["exp"])
     return token_data
+
+
+def bearer_token(authorization: Optional[str]) -> str:
+    """Extract the token from an Authorization: Bearer header"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token.strip()
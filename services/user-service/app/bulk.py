@@ -0,0 +1,127 @@
+
+import os
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Set, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, auth
+
+IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "500"))
+
+
+def ndjson_records(body: bytes) -> Iterator[Tuple[int, Any]]:
+    """(line number, decoded value) for each non-blank NDJSON line"""
+    for line_no, line in enumerate(body.split(b"\n"), 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+
+
+def result(row: int, status: str, **fields) -> bytes:
+    return json.dumps({"row": row, "status": status, **fields}).encode() + b"\n"
+
+
+class UserImporter:
+    """Import users in chunks: one existence query, parallel hashing and one multi-row insert per chunk"""
+
+    def __init__(self, db_session: AsyncSession, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db_session = db_session
+        self.chunk_size = chunk_size
+        self.seen: Set[str] = set()
+        self.counts = {"created": 0, "duplicate": 0, "invalid": 0}
+
+    async def run(self, records: Iterable[Tuple[int, Any]]) -> AsyncIterator[bytes]:
+        """Per-row NDJSON results, streamed chunk by chunk, then a summary line"""
+        chunk: List[Tuple[int, schemas.UserImport]] = []
+        for row, record in records:
+            try:
+                if isinstance(record, Exception):
+                    raise ValueError(f"Invalid JSON: {record}")
+                if not isinstance(record, dict):
+                    raise ValueError("Each record must be a JSON object")
+                chunk.append((row, schemas.UserImport(**record)))
+            except (ValueError, ValidationError) as e:
+                self.counts["invalid"] += 1
+                yield result(row, "invalid", error=str(e))
+                continue
+            if len(chunk) >= self.chunk_size:
+                yield await self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield await self.import_chunk(chunk)
+        yield json.dumps({"summary": self.counts}).encode() + b"\n"
+
+    async def import_chunk(self, chunk: List[Tuple[int, schemas.UserImport]]) -> bytes:
+        lines = []
+        fresh = []
+        for row, user in chunk:
+            if user.email in self.seen:
+                self.counts["duplicate"] += 1
+                lines.append(result(row, "duplicate", email=user.email))
+                continue
+            self.seen.add(user.email)
+            fresh.append((row, user))
+
+        existing = await self.existing_emails(user.email for _, user in fresh)
+        pending = []
+        for row, user in fresh:
+            if user.email in existing:
+                self.counts["duplicate"] += 1
+                lines.append(result(row, "duplicate", email=user.email))
+            else:
+                pending.append((row, user))
+
+        # Only plaintext passwords are hashed; pre-hashed rows are migrated as is
+        plaintext = [user.password for _, user in pending if user.password_hash is None]
+        hashes = iter(await auth.hash_passwords(plaintext))
+        rows = [
+            {
+                "email": user.email,
+                "name": user.name,
+                "password_hash": user.password_hash if user.password_hash is not None else next(hashes),
+            }
+            for _, user in pending
+        ]
+
+        created = await self.insert_rows(rows)
+        for row, user in pending:
+            user_id = created.get(user.email)
+            if user_id is None:
+                # Registered by someone else between our check and the insert
+                self.counts["duplicate"] += 1
+                lines.append(result(row, "duplicate", email=user.email))
+            else:
+                self.counts["created"] += 1
+                lines.append(result(row, "created", email=user.email, id=user_id))
+        return b"".join(lines)
+
+    async def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        emails = list(emails)
+        if not emails:
+            return set()
+        query = select(models.User.email).where(models.User.email.in_(emails))
+        return set((await self.db_session.execute(query)).scalars())
+
+    async def insert_rows(self, rows: List[Dict[str, str]]) -> Dict[str, int]:
+        """Insert rows in one transaction and return email -> id for those inserted"""
+        if not rows:
+            return {}
+        statement = insert(models.User).returning(models.User.id, models.User.email)
+        try:
+            inserted = (await self.db_session.execute(statement, rows)).all()
+            await self.db_session.commit()
+        except IntegrityError:
+            # A concurrent registration won a race: drop the now-existing emails and retry once
+            await self.db_session.rollback()
+            existing = await self.existing_emails(row["email"] for row in rows)
+            rows = [row for row in rows if row["email"] not in existing]
+            if not rows:
+                return {}
+            inserted = (await self.db_session.execute(statement, rows)).all()
+            await self.db_session.commit()
+        return {email: user_id for user_id, email in inserted}
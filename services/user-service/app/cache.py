@@ -0,0 +1,120 @@
+
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from . import models
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_BACKEND = os.getenv("PROFILE_CACHE_BACKEND", "memory")
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+
+def profile_from_user(user: models.User) -> Dict[str, Any]:
+    """The UserResponse fields of a user row"""
+    return {
+        "id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "created_at": user.created_at,
+        "updated_at": user.updated_at,
+    }
+
+
+class ProfileCache:
+    """Read-through cache of user profiles keyed by email.
+
+    Profiles live in a bounded in-process LRU by default. With
+    PROFILE_CACHE_BACKEND=redis they are stored in Redis instead, so every
+    worker sees the same entries and an invalidation reaches all of them.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300, redis=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis = redis
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "ProfileCache":
+        redis = None
+        if PROFILE_CACHE_BACKEND == "redis":
+            from redis import asyncio as aioredis
+            redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+        return cls(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, redis)
+
+    async def get(self, email: str) -> Optional[Dict[str, Any]]:
+        if self.redis is not None:
+            try:
+                cached = await self.redis.get(f"profile:{email}")
+            except Exception as e:
+                # A Redis outage degrades to database reads, not errors
+                self.errors += 1
+                logger.error(f"Profile cache read failed: {e}")
+                cached = None
+            profile = json.loads(cached) if cached else None
+        else:
+            profile = self._get_local(email)
+        if profile is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return profile
+
+    async def put(self, email: str, profile: Dict[str, Any]):
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"profile:{email}", json.dumps(profile, default=str), ex=int(self.ttl))
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Profile cache write failed: {e}")
+            return
+        self._entries[email] = (profile, time.monotonic() + self.ttl)
+        self._entries.move_to_end(email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, email: str):
+        """Drop a profile after it changes"""
+        self._entries.pop(email, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(f"profile:{email}")
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Profile cache invalidation failed: {e}")
+
+    def _get_local(self, email: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(email)
+        if entry is None:
+            return None
+        profile, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[email]
+            return None
+        self._entries.move_to_end(email)
+        return profile
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self.redis is not None else "memory",
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+profile_cache = ProfileCache.from_env()
@@ -1,11 +1,8 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from . import models, routes
-from .db import engine
-
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+from . import models, routes, auth, cache
+from .db import engine, pool_status
 
 app = FastAPI(
     title="User Service",
@@ -26,6 +23,21 @@ app.add_middleware(
 app.include_router(routes.router, prefix="/users", tags=["users"])
 
 
+@app.on_event("startup")
+async def create_tables():
+    """Create database tables"""
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the bcrypt worker pool and close the profile cache and database pool"""
+    auth.password_hasher.shutdown()
+    await cache.profile_cache.close()
+    await engine.dispose()
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -36,3 +48,9 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     return {"status": "ok", "service": "user-service"}
+
+
+@app.get("/db/pool")
+async def db_pool():
+    """Database connection pool occupancy and checkout wait times"""
+    return pool_status()
@@ -1,17 +1,20 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from . import models, schemas, auth, db
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from . import models, schemas, auth, db, cache, bulk
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=schemas.UserResponse)
-async def register_user(user: schemas.UserCreate, db_session: Session = Depends(db.get_db)):
+async def register_user(user: schemas.UserCreate, db_session: AsyncSession = Depends(db.get_db)):
     """Register a new user"""
     # Check if user already exists
-    db_user = db_session.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db_session.scalar(select(models.User).where(models.User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -19,45 +22,126 @@ async def register_user(user: schemas.UserCreate, db_session: Session = Depends(
         )
     
     # Create new user
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await auth.hash_password(user.password)
     db_user = models.User(
         email=user.email,
         password_hash=hashed_password,
         name=user.name
     )
     db_session.add(db_user)
-    db_session.commit()
-    db_session.refresh(db_user)
+    await db_session.commit()
+    await db_session.refresh(db_user)
     
     return db_user
 
 
+@router.post("/import", dependencies=[Depends(auth.require_import_token)])
+async def import_users(request: Request, db_session: AsyncSession = Depends(db.get_db)):
+    """Bulk import users from NDJSON or a JSON array, streaming back one result per row; needs X-Import-Token"""
+    # Read the body before streaming results: the streaming response listens
+    # for disconnects on the same receive channel and would swallow body chunks
+    body = await request.body()
+    if "ndjson" in request.headers.get("content-type", ""):
+        records = bulk.ndjson_records(body)
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+        records = enumerate(items, 1)
+    
+    importer = bulk.UserImporter(db_session)
+    return StreamingResponse(importer.run(records), media_type="application/x-ndjson")
+
+
 @router.post("/login", response_model=schemas.Token)
-async def login_user(user: schemas.UserLogin, db_session: Session = Depends(db.get_db)):
+async def login_user(user: schemas.UserLogin, db_session: AsyncSession = Depends(db.get_db)):
     """Login user and return access token"""
     # Verify user credentials
-    db_user = db_session.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not auth.verify_password(user.password, db_user.password_hash):
+    db_user = await db_session.scalar(select(models.User).where(models.User.email == user.email))
+    verified, new_hash = False, None
+    if db_user:
+        verified, new_hash = await auth.check_password(user.password, db_user.password_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored hash used a different bcrypt cost: upgrade it while we have the plaintext
+        db_user.password_hash = new_hash
+        await db_session.commit()
     
     # Create access token
-    access_token = auth.create_access_token(data={"sub": db_user.email})
+    access_token = auth.create_access_token(data={"sub": db_user.email, "uid": db_user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+async def load_profile(email: str, db_session: AsyncSession) -> dict:
+    """Profile for email, read through the profile cache"""
+    profile = await cache.profile_cache.get(email)
+    if profile is not None:
+        return profile
+    db_user = await db_session.scalar(select(models.User).where(models.User.email == email))
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    profile = cache.profile_from_user(db_user)
+    await cache.profile_cache.put(email, profile)
+    return profile
+
+
 @router.get("/me", response_model=schemas.UserResponse)
 async def get_current_user(
-    db_session: Session = Depends(db.get_db)
+    authorization: Optional[str] = Header(None),
+    db_session: AsyncSession = Depends(db.get_db)
 ):
+    """Profile of the user the Bearer token was issued to"""
+    token_data = auth.verify_token(auth.bearer_token(authorization))
+    return await load_profile(token_data.email, db_session)
+
+
+@router.put("/me", response_model=schemas.UserResponse)
+async def update_current_user(
+    update: schemas.UserUpdate,
+    authorization: Optional[str] = Header(None),
+    db_session: AsyncSession = Depends(db.get_db)
+):
+    """Update the caller's profile"""
+    token_data = auth.verify_token(auth.bearer_token(authorization))
+    db_user = await db_session.scalar(select(models.User).where(models.User.email == token_data.email))
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED,
-        detail="This endpoint requires proper token extraction from headers"
-    )
+    if update.name is not None:
+        db_user.name = update.name
+    await db_session.commit()
+    await db_session.refresh(db_user)
+    await cache.profile_cache.invalidate(db_user.email)
+    
+    return cache.profile_from_user(db_user)
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Token and profile cache hit rates"""
+    return {"tokens": auth.token_cache.stats(), "profiles": cache.profile_cache.stats()}
+
+
+@router.get("/password-hashing")
+async def password_hashing_stats():
+    """bcrypt worker pool saturation"""
+    return auth.password_hasher.stats()
 
 
 @router.get("/health")
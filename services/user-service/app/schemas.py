@@ -1,8 +1,11 @@
 
-from pydantic import BaseModel, EmailStr
+import re
+from pydantic import BaseModel, EmailStr, root_validator, validator
 from typing import Optional
 from datetime import datetime
 
+BCRYPT_HASH = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -10,11 +13,35 @@ class UserCreate(BaseModel):
     name: str
 
 
+class UserImport(BaseModel):
+    email: EmailStr
+    name: str
+    password: Optional[str] = None
+    # An existing bcrypt hash, migrated as is instead of hashing a plaintext password
+    password_hash: Optional[str] = None
+
+    @validator("password_hash")
+    def bcrypt_hash(cls, value):
+        if value is not None and not BCRYPT_HASH.match(value):
+            raise ValueError("password_hash is not a bcrypt hash")
+        return value
+
+    @root_validator(skip_on_failure=True)
+    def one_credential(cls, values):
+        if (values.get("password") is None) == (values.get("password_hash") is None):
+            raise ValueError("exactly one of password and password_hash is required")
+        return values
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
 
+class UserUpdate(BaseModel):
+    name: Optional[str] = None
+
+
 class UserResponse(BaseModel):
     id: int
     email: str
@@ -23,7 +50,7 @@ class UserResponse(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
+        orm_mode = True
 
 
 class Token(BaseModel):